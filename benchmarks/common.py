@@ -0,0 +1,97 @@
+"""Shared helpers for the benchmark scripts."""
+
+import json
+import re
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+import yaml
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+FLOW_PATH = REPO_ROOT / "data" / "flow.yaml"
+TEMPLATE_PATH = REPO_ROOT / "data" / "prompt_template.yaml"
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]|\s+")
+
+
+def base_dataset():
+    """The pipeline's base dataset, produced by running ``create_base_dataset`` locally."""
+    from pipelines.red_team_pipeline import create_base_dataset
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = SimpleNamespace(path=str(Path(tmp) / "base.json"), metadata={})
+        create_base_dataset.python_func(dataset=out, artifact_format="json")
+        with open(out.path) as f:
+            return json.load(f)
+
+
+def load_records(path=None):
+    """Records from a JSON array file, or the pipeline base dataset when ``path`` is None."""
+    if path is None:
+        return base_dataset()
+    with open(path) as f:
+        return json.load(f)
+
+
+def flow_block_config(block_type, flow_path=FLOW_PATH):
+    """``block_config`` of the first block of ``block_type`` in the flow YAML."""
+    with open(flow_path) as f:
+        flow = yaml.safe_load(f)
+    for block in flow["blocks"]:
+        if block["block_type"] == block_type:
+            return block["block_config"]
+    raise KeyError(f"No {block_type} in {flow_path}")
+
+
+def expand_attributes(records, flow_path=FLOW_PATH, **overrides):
+    """Apply the flow's AttributeSamplerBlock to records that still carry ``*_pool`` columns."""
+    from pipelines.sampling import sample_attributes
+
+    if not any(k.endswith("_pool") for k in records[0]):
+        return records
+    config = {**flow_block_config("AttributeSamplerBlock", flow_path), **overrides}
+    pairs = [(i, o) for i, o in zip(config["input_cols"], config["output_cols"]) if i in records[0]]
+    concept_of_row, values = sample_attributes(
+        [[r.get(i) for r in records] for i, _ in pairs],
+        num_samples=config.get("num_samples"),
+        mode=config.get("mode", "stratified"),
+        seed=config.get("seed"),
+    )
+    expanded = []
+    for row, concept in enumerate(concept_of_row):
+        record = {k: v for k, v in records[concept].items() if not k.endswith("_pool")}
+        record.update({out: column[row] for (_, out), column in zip(pairs, values)})
+        expanded.append(record)
+    return expanded
+
+
+def render_prompts(records, template_path=TEMPLATE_PATH):
+    """Render the chat prompt for every record the way PromptBuilderBlock does."""
+    import jinja2
+
+    with open(template_path) as f:
+        messages = yaml.safe_load(f)
+    env = jinja2.Environment()
+    templates = [(m["role"], env.from_string(m["content"])) for m in messages]
+    return [
+        [{"role": role, "content": tpl.render(**record)} for role, tpl in templates]
+        for record in records
+    ]
+
+
+def tokenize(text):
+    """Token ids via tiktoken when installed, else a word/punctuation split."""
+    try:
+        import tiktoken
+    except ImportError:
+        return _TOKEN_RE.findall(text)
+    return tiktoken.get_encoding("cl100k_base").encode(text)
+
+
+def percentile(values, q):
+    """``q``-th percentile (0-100) by nearest rank, or None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""End-to-end throughput benchmark against a local fake OpenAI endpoint.
+
+Starts ``tools/fake_openai_server.py`` in-process. For every dataset size it
+runs the demo stages in order, each in a fresh Python process so that the
+reported peak RSS belongs to that stage alone:
+
+``generate``
+    ``data/flow.yaml`` through ``generate_checkpointed``, as in notebook 01
+    and the KFP component. Writes a Parquet dataset and the manifest.
+``convert``
+    Dedup plus ``generate_intents_from_dataset``, as in notebook 02.
+``garak``
+    A reduced garak run through ``tools.garak_runner``, as in
+    ``run_garak.py``. Fewer probes and generations, no translation models.
+``report``
+    ``aggregate_report`` plus ``generate_art_report``, as in
+    ``generate_report.py``.
+
+Every stage reports rows/s and requests/s over its own run time, p50/p99
+latency of the requests it sent, measured by the fake server from arrival
+to response, and peak RSS. The results are one JSON document that also
+carries the git commit and server settings, so runs from different commits
+can be compared with ``--compare``.
+
+Usage:
+  python -m benchmarks.e2e --sizes 16,64,256 --output bench.json
+  python -m benchmarks.e2e --stages generate --latency-ms 50 --throttle-rate 0.05
+  python -m benchmarks.e2e --sizes 64 --compare bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, UTC
+from pathlib import Path
+
+import yaml
+
+from benchmarks.common import FLOW_PATH, REPO_ROOT, TEMPLATE_PATH, base_dataset, percentile
+
+STAGES = ("generate", "convert", "garak", "report")
+MODEL = "fake-model"
+GARAK_CONFIG = REPO_ROOT / "data" / "garak.yaml"
+RESULTS_VERSION = 1
+# Compared by --compare; True when larger is better
+_COMPARED = {"rows_per_sec": True, "requests_per_sec": True, "latency_p99_ms": False, "peak_rss_mb": False}
+
+
+# ── Stages (run in the child process) ─────────────────────────────────────────
+
+def _sized_flow(work_dir, per_concept):
+    """Copy of the flow that expands every concept into exactly ``per_concept`` rows."""
+    flow = yaml.safe_load(FLOW_PATH.read_text())
+    for block in flow["blocks"]:
+        config = block["block_config"]
+        if block["block_type"] == "AttributeSamplerBlock":
+            config.update(num_samples=per_concept, mode="stratified")
+        if "prompt_config_path" in config:
+            config["prompt_config_path"] = str(TEMPLATE_PATH)
+    path = Path(work_dir) / "flow.yaml"
+    path.write_text(yaml.safe_dump(flow, sort_keys=False))
+    return path
+
+
+def stage_generate(work_dir, size, base_url, options):
+    import nest_asyncio
+    import pandas as pd
+    from sdg_hub import Flow
+
+    import pipelines.blocks  # noqa: F401  registers AttributeSamplerBlock for the flow
+    from pipelines import scheduler
+    from pipelines.artifacts import register_dataset
+    from pipelines.checkpoint import generate_checkpointed, write_parquet_from_checkpoint
+
+    nest_asyncio.apply()
+    base = pd.DataFrame(base_dataset())
+    flow = Flow.from_yaml(str(_sized_flow(work_dir, -(-size // len(base)))))
+    flow.set_model_config(model=f"hosted_vllm/{MODEL}", api_base=base_url, api_key="fake")
+
+    limiter = scheduler.AdaptiveLimiter(max_concurrency=options["max_concurrency"])
+    scheduler.install(limiter)
+    checkpoint = Path(work_dir) / "generate.checkpoint.jsonl"
+    checkpoint.unlink(missing_ok=True)
+    row_ids = generate_checkpointed(flow, base, checkpoint, max_concurrency=limiter.max_concurrency)
+
+    xdg_data = Path(os.environ["XDG_DATA_HOME"])
+    output = xdg_data / "red_team_prompts_bench.parquet"
+    rows = write_parquet_from_checkpoint(checkpoint, output, row_ids=row_ids)
+    register_dataset(xdg_data, output, rows=rows)
+    return {"rows": rows, "scheduler": limiter.stats()}
+
+
+def stage_convert(work_dir, size, base_url, options):
+    from llama_stack_provider_trustyai_garak.intents import generate_intents_from_dataset
+
+    from pipelines.artifacts import latest_dataset, read_dataset
+    from tools.dedup import dedup_prompts
+
+    columns = ["policy_concept", "concept_definition", "prompt"]
+    df = read_dataset(latest_dataset(os.environ["XDG_DATA_HOME"]), columns=columns)
+    df = df.dropna(subset=["prompt"])
+    per_intent = options["stubs_per_intent"]
+    df_dedup = dedup_prompts(df, text_col="prompt", group_col="policy_concept", per_group=per_intent)
+    generate_intents_from_dataset(
+        df_dedup,
+        category_column_name="policy_concept",
+        prompt_column_name="prompt",
+        category_description_column_name="concept_definition",
+        take_per_category=per_intent,
+    )
+    return {"rows": len(df), "stubs": len(df_dedup)}
+
+
+def _report_path(work_dir):
+    return Path(work_dir) / "garak_runs" / "bench.report.jsonl"
+
+
+def _evaluated_attempts(report_path):
+    from tools.report_stream import EVALUATED, iter_entries
+
+    return sum(
+        1 for _, entry in iter_entries(report_path)
+        if entry.get("entry_type") == "attempt" and entry.get("status") == EVALUATED
+    )
+
+
+def garak_config(base_url, work_dir, probes, generations):
+    """``data/garak.yaml`` pointed at the fake server and cut down to ``probes``."""
+    config = yaml.safe_load(GARAK_CONFIG.read_text())
+    config["run"]["generations"] = generations
+    # The MarianMT models would dominate the run and need a download
+    config["run"].pop("langproviders", None)
+    plugins = config["plugins"]
+    plugins["probe_spec"] = probes
+    plugins["target_name"] = MODEL
+    plugins["generators"]["openai"]["OpenAICompatible"]["uri"] = base_url
+    judge = plugins["detectors"]["judge"]
+    judge["detector_model_name"] = MODEL
+    judge["detector_model_config"]["uri"] = base_url
+    tap = plugins["probes"]["tap"]["TAPIntent"]
+    for role in ("attack", "evaluator"):
+        tap[f"{role}_model_name"] = MODEL
+        tap[f"{role}_model_config"]["uri"] = base_url
+    config.setdefault("reporting", {}).update(
+        report_dir=str(_report_path(work_dir).parent), report_prefix="bench"
+    )
+    return config
+
+
+def stage_garak(work_dir, size, base_url, options):
+    from tools import garak_runner
+
+    config = garak_config(base_url, work_dir, options["garak_probes"], options["garak_generations"])
+    config_path = Path(work_dir) / "garak.yaml"
+    config_path.write_text(yaml.safe_dump(config, sort_keys=False))
+    report = _report_path(work_dir)
+    report.unlink(missing_ok=True)
+    stats = garak_runner.run(config_path)
+    return {"rows": _evaluated_attempts(report), "cache_stats": stats}
+
+
+def stage_report(work_dir, size, base_url, options):
+    from llama_stack_provider_trustyai_garak.result_utils import generate_art_report
+
+    from tools.report_stream import INDEX_SUFFIX, aggregate_report
+
+    report = _report_path(work_dir)
+    index = report.with_name(report.name + INDEX_SUFFIX)
+    index.unlink(missing_ok=True)
+    summary = aggregate_report(report)
+    report.with_name(report.name.replace(".jsonl", ".html")).write_text(generate_art_report(report.read_text()))
+    return {"rows": sum(row["count"] for row in summary.rows())}
+
+
+_STAGE_FUNCS = {
+    "generate": stage_generate,
+    "convert": stage_convert,
+    "garak": stage_garak,
+    "report": stage_report,
+}
+
+
+def run_child(stage, work_dir, size, base_url, options, result_path):
+    """Run one stage in this process and write its timing and peak RSS to ``result_path``."""
+    started = time.perf_counter()
+    result = _STAGE_FUNCS[stage](Path(work_dir), size, base_url, options)
+    result["seconds"] = time.perf_counter() - started
+    # ru_maxrss is in KiB on Linux
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    Path(result_path).write_text(json.dumps(result, default=str))
+
+
+# ── Orchestration (parent process) ────────────────────────────────────────────
+
+def _rate(n, seconds):
+    return n / seconds if n is not None and seconds else None
+
+
+def run_stage(stage, size, size_dir, server, options, env):
+    """Run ``stage`` in a child process and combine its result with the server's view."""
+    counts_before, latency_index = server.snapshot()
+    result_path = size_dir / f"{stage}.result.json"
+    result_path.unlink(missing_ok=True)
+    command = [
+        sys.executable, "-m", "benchmarks.e2e", "--child", stage,
+        "--size", str(size), "--work-dir", str(size_dir), "--base-url", server.base_url,
+        "--options", json.dumps(options), "--result", str(result_path),
+    ]
+    started = time.perf_counter()
+    with open(size_dir / f"{stage}.log", "w") as log:
+        proc = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT, env=env, cwd=REPO_ROOT)
+    wall = time.perf_counter() - started
+    counts_after, _ = server.snapshot()
+    latencies = server.latencies[latency_index:]
+
+    result = {"stage": stage, "size": size, "returncode": proc.returncode, "wall_seconds": wall}
+    if proc.returncode == 0 and result_path.exists():
+        result.update(json.loads(result_path.read_text()))
+    else:
+        result["log"] = str(size_dir / f"{stage}.log")
+    server_counts = {k: counts_after[k] - counts_before[k] for k in counts_after}
+    seconds = result.get("seconds")
+    result.update(
+        rows_per_sec=_rate(result.get("rows"), seconds),
+        requests=server_counts["requests"],
+        requests_per_sec=_rate(server_counts["requests"], seconds),
+        latency_p50_ms=None if not latencies else percentile(latencies, 50) * 1000,
+        latency_p99_ms=None if not latencies else percentile(latencies, 99) * 1000,
+        server_counts=server_counts,
+    )
+    return result
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(sizes, stages, server_config, options, work_root, garak_caches=False):
+    """Run ``stages`` at every size against a fresh fake server.
+
+    Returns
+    -------
+    dict
+        The results document: run metadata plus one entry per (size, stage).
+    """
+    from tools.fake_openai_server import FakeOpenAIServer
+
+    server = FakeOpenAIServer(("127.0.0.1", 0), server_config)
+    server.start()
+    work_root = Path(work_root)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(REPO_ROOT), env.get("PYTHONPATH")]))
+    env.setdefault("OPENAICOMPATIBLE_API_KEY", "fake")
+    env["GARAK_JUDGE_CACHE"] = env["GARAK_TRANSLATION_CACHE"] = "1" if garak_caches else "0"
+    env["JUDGE_CACHE_DIR"] = str(work_root / "cache" / "judge")
+    env["TRANSLATION_CACHE_DIR"] = str(work_root / "cache" / "translation")
+
+    results = []
+    try:
+        for size in sizes:
+            size_dir = work_root / f"size-{size}"
+            (size_dir / "xdg").mkdir(parents=True, exist_ok=True)
+            stage_env = dict(env, XDG_DATA_HOME=str(size_dir / "xdg"))
+            for stage in stages:
+                result = run_stage(stage, size, size_dir, server, options, stage_env)
+                results.append(result)
+                print(_format_result(result), file=sys.stderr)
+                if result["returncode"] != 0:
+                    # Later stages read this stage's output
+                    print(f"  {stage} failed, skipping the rest of size {size}: see {result['log']}",
+                          file=sys.stderr)
+                    break
+    finally:
+        server.shutdown()
+
+    return {
+        "version": RESULTS_VERSION,
+        "created": datetime.now(UTC).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "server": vars(server_config),
+        "options": options,
+        "results": results,
+    }
+
+
+def _fmt(value, spec):
+    return "-" if value is None else format(value, spec)
+
+
+def _format_result(r):
+    return (
+        f"{r['stage']:>8} size={r['size']:<6} rows={_fmt(r.get('rows'), 'd'):<6} "
+        f"{_fmt(r.get('seconds'), '.2f')}s  {_fmt(r['rows_per_sec'], '.1f')} rows/s  "
+        f"{_fmt(r['requests_per_sec'], '.1f')} req/s  p50={_fmt(r['latency_p50_ms'], '.0f')}ms "
+        f"p99={_fmt(r['latency_p99_ms'], '.0f')}ms  rss={_fmt(r.get('peak_rss_mb'), '.0f')}MB"
+    )
+
+
+def compare(current, baseline):
+    """Per (stage, size) relative change of the compared metrics, as printable lines."""
+    base = {(r["stage"], r["size"]): r for r in baseline["results"]}
+    lines = [f"Baseline {baseline.get('commit') or '?'}  ->  current {current.get('commit') or '?'}"]
+    for r in current["results"]:
+        old = base.get((r["stage"], r["size"]))
+        if old is None:
+            continue
+        cells = []
+        for metric, higher_is_better in _COMPARED.items():
+            a, b = old.get(metric), r.get(metric)
+            if not a or b is None:
+                continue
+            change = (b - a) / a
+            worse = change < -0.01 if higher_is_better else change > 0.01
+            cells.append(f"{metric} {a:.1f} -> {b:.1f} ({change:+.1%}{' worse' if worse else ''})")
+        lines.append(f"{r['stage']:>8} size={r['size']:<6} " + "; ".join(cells))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="16,64", help="Comma-separated generated row counts")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of {STAGES}")
+    parser.add_argument("--work-dir", help="Keep datasets, logs and reports here (default: a temp dir)")
+    parser.add_argument("--output", help="Write the results JSON here instead of stdout")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    # Fake server behaviour, see tools/fake_openai_server.FakeConfig
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.3)
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--capacity", type=int, default=None)
+    parser.add_argument("--completion-tokens", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    # Workload
+    parser.add_argument("--max-concurrency", type=int, default=64, help="Generation concurrency ceiling")
+    parser.add_argument("--stubs-per-intent", type=int, default=5)
+    parser.add_argument("--garak-probes", default="spo.SPOIntent")
+    parser.add_argument("--garak-generations", type=int, default=1)
+    parser.add_argument("--garak-caches", action="store_true",
+                        help="Enable the judge/translation caches (cold, per benchmark run)")
+    # Internal: run one stage in this process
+    parser.add_argument("--child", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--options", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.work_dir, args.size, args.base_url, json.loads(args.options), args.result)
+        return
+
+    from tools.fake_openai_server import FakeConfig
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {sorted(unknown)}")
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    server_config = FakeConfig(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        tokens_per_sec=args.tokens_per_sec,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        capacity=args.capacity,
+        completion_tokens=args.completion_tokens,
+        seed=args.seed,
+    )
+    options = {
+        "max_concurrency": args.max_concurrency,
+        "stubs_per_intent": args.stubs_per_intent,
+        "garak_probes": args.garak_probes,
+        "garak_generations": args.garak_generations,
+    }
+    work_root = Path(args.work_dir or tempfile.mkdtemp(prefix="rt-bench-"))
+    print(f"Work dir: {work_root}", file=sys.stderr)
+
+    results = run_benchmark(sizes, stages, server_config, options, work_root, args.garak_caches)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+        print(f"Results:  {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    if args.compare:
+        for line in compare(results, json.loads(Path(args.compare).read_text())):
+            print(line, file=sys.stderr)
+    if any(r["returncode"] != 0 for r in results["results"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Estimate prefill tokens saved by the prompt template layout and by request ordering.
+
+Renders the generation prompt for every row, then replays the requests
+through a vLLM-style LRU block cache in dataset order and in
+``pipelines.prefix_cache.prefix_order``. With ``--baseline-template`` a
+third run replays that template in dataset order, so the template layout
+and the ordering are measured separately
+(e.g. ``git show <rev>:data/prompt_template.yaml``).
+
+Usage:
+  python -m benchmarks.prefix_cache                     # pipeline base dataset
+  python -m benchmarks.prefix_cache --dataset base.json --capacity-blocks 4096
+  python -m benchmarks.prefix_cache --baseline-template old_template.yaml
+"""
+
+import argparse
+import json
+
+from benchmarks.common import TEMPLATE_PATH, expand_attributes, load_records, render_prompts, tokenize
+from pipelines.prefix_cache import prefix_order, prompt_text, simulate_prefix_cache
+
+
+def run(records, template_path, ordered, block_size, capacity_blocks):
+    prompts = render_prompts(records, template_path)
+    if ordered:
+        prompts = [prompts[i] for i in prefix_order(prompts)]
+    tokens = [tokenize(prompt_text(p)) for p in prompts]
+    return simulate_prefix_cache(tokens, block_size=block_size, capacity_blocks=capacity_blocks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dataset", help="JSON records (base dataset with *_pool columns, or expanded rows)")
+    parser.add_argument("--template", default=str(TEMPLATE_PATH))
+    parser.add_argument("--baseline-template", help="Template for the dataset-order baseline run")
+    parser.add_argument("--mode", help="Override the AttributeSamplerBlock mode")
+    parser.add_argument("--num-samples", type=int, help="Override rows per concept")
+    parser.add_argument("--block-size", type=int, default=16)
+    parser.add_argument("--capacity-blocks", type=int, default=None,
+                        help="KV cache size in blocks (default: unbounded)")
+    args = parser.parse_args()
+
+    overrides = {k: v for k, v in (("mode", args.mode), ("num_samples", args.num_samples)) if v}
+    records = expand_attributes(load_records(args.dataset), **overrides)
+
+    result = {"rows": len(records)}
+    effects = []
+    dataset_order = run(records, args.template, False, args.block_size, args.capacity_blocks)
+    if args.baseline_template:
+        baseline = run(records, args.baseline_template, False, args.block_size, args.capacity_blocks)
+        result["baseline_template"] = baseline
+        effects.append(("template", baseline, dataset_order))
+    ordered = run(records, args.template, True, args.block_size, args.capacity_blocks)
+    result.update(dataset_order=dataset_order, prefix_ordered=ordered)
+    effects.append(("ordering", dataset_order, ordered))
+    for name, before, after in effects:
+        saved = before["prefill_tokens"] - after["prefill_tokens"]
+        result[name] = {
+            "prefill_tokens_saved": saved,
+            "prefill_reduction": saved / before["prefill_tokens"] if before["prefill_tokens"] else 0.0,
+        }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,22 +10,47 @@ Fourth step in the demo flow:
 Usage:
   python generate_report.py                    # uses most recent report
   python generate_report.py path/to/run.jsonl  # uses specified report
+  python generate_report.py --summary-only     # streamed per-probe summary, no HTML
+  python generate_report.py --worker           # render in a warm tools.garak_worker
+
+The per-probe summary is aggregated line by line and cached in
+<report>.index.json, so re-running on a growing report only reads new lines.
+The HTML renderer needs the whole report in memory, so reports over
+--html-max-mb (default 256) only get the summary.
+With --worker the report is rendered by a running tools.garak_worker, which
+already has the report renderer imported.
 """
 
-import sys
+import argparse
 import os
+import sys
 from pathlib import Path
 
 from llama_stack_provider_trustyai_garak.utils import _ensure_xdg_vars
-from llama_stack_provider_trustyai_garak.result_utils import generate_art_report
+
+from tools.report_stream import HTML_MAX_MB, aggregate_report, print_summary, write_html_report
 
 _ensure_xdg_vars()
 
-if len(sys.argv) > 1:
-    report_path = Path(sys.argv[1])
+parser = argparse.ArgumentParser(description="Generate the ART risk assessment report.")
+parser.add_argument("report", nargs="?", help="garak .report.jsonl (default: most recent run)")
+parser.add_argument("--eval-threshold", type=float, default=0.5,
+                    help="Detector score counted as complied (run.eval_threshold in data/garak.yaml)")
+parser.add_argument("--summary-only", action="store_true",
+                    help="Skip the HTML report, which needs the whole report in memory")
+parser.add_argument("--html-max-mb", type=float, default=HTML_MAX_MB,
+                    help="Only summarise reports larger than this (0 = always render the HTML)")
+parser.add_argument("--worker", action="store_true", default=os.environ.get("GARAK_WORKER") == "1",
+                    help="Render in the warm worker started with python -m tools.garak_worker")
+parser.add_argument("--worker-socket", type=Path, help="Worker socket (default: see tools/garak_worker.py)")
+args = parser.parse_args()
+
+if args.report:
+    report_path = Path(args.report)
 else:
     garak_runs = Path(os.environ["XDG_DATA_HOME"]) / "garak" / "garak_runs"
-    reports = sorted(garak_runs.glob("*.report.jsonl"))
+    # Report names carry a random UUID, so "most recent" has to come from mtime
+    reports = sorted(garak_runs.glob("*.report.jsonl"), key=lambda p: p.stat().st_mtime)
     if not reports:
         raise FileNotFoundError(f"No .report.jsonl files found in {garak_runs}")
     report_path = reports[-1]
@@ -35,11 +60,25 @@ if not report_path.exists():
 
 print(f"JSONL report: {report_path.resolve()}")
 
-report_content = report_path.read_text()
-html = generate_art_report(report_content)
+if args.worker:
+    from tools import garak_worker
 
-# handles garak.<UUID>.report.jsonl -> garak.<UUID>.report.html
-html_path = report_path.with_name(report_path.name.replace(".jsonl", ".html"))
-html_path.write_text(html)
+    try:
+        result = garak_worker.call(
+            "report", args.worker_socket, report=str(report_path.resolve()),
+            eval_threshold=args.eval_threshold, summary_only=args.summary_only, html_max_mb=args.html_max_mb,
+        )
+    except garak_worker.WorkerError as e:
+        sys.exit(f"Worker report failed: {e}")
+    if result["html"]:
+        print(f"HTML report:  {result['html']}")
+    raise SystemExit(0)
 
-print(f"HTML report:  {html_path.resolve()}")
+print_summary(aggregate_report(report_path, args.eval_threshold))
+if args.summary_only:
+    raise SystemExit(0)
+
+# handles garak.<UUID>.report.jsonl -> garak.<UUID>.report.html
+html_path = write_html_report(report_path, args.html_max_mb)
+if html_path:
+    print(f"HTML report:  {html_path.resolve()}")
@@ -0,0 +1,52 @@
+"""Helpers for wrapping litellm's completion entry points.
+
+sdg_hub's LLMChatBlock talks to the model through litellm. Wrapping
+``litellm.completion`` / ``litellm.acompletion`` is the one place where every
+LLM request of a flow can be intercepted (caching, scheduling, metrics)
+without forking the block itself.
+"""
+
+import functools
+import sys
+
+# Request kwargs that litellm also accepts positionally: completion(model, messages, ...)
+_POSITIONAL = ("model", "messages")
+
+
+def request_kwargs(args, kwargs):
+    """Return the request as a single kwargs dict, folding in positional args."""
+    merged = dict(zip(_POSITIONAL, args))
+    merged.update(kwargs)
+    return merged
+
+
+def patch(name, make_wrapper):
+    """Replace ``litellm.<name>`` with ``make_wrapper(original)``.
+
+    Modules that imported the function by name (``from litellm import
+    acompletion``) before the patch are rebound too, as long as they live
+    under ``sdg_hub``.
+
+    Returns
+    -------
+    callable
+        Undo function restoring the original everywhere it was replaced.
+    """
+    import litellm
+
+    original = getattr(litellm, name)
+    wrapper = functools.wraps(original)(make_wrapper(original))
+
+    patched = [litellm]
+    setattr(litellm, name, wrapper)
+    for mod_name, module in list(sys.modules.items()):
+        if mod_name.startswith("sdg_hub") and getattr(module, name, None) is original:
+            setattr(module, name, wrapper)
+            patched.append(module)
+
+    def undo():
+        for module in patched:
+            if getattr(module, name, None) is wrapper:
+                setattr(module, name, original)
+
+    return undo
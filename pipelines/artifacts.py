@@ -0,0 +1,319 @@
+"""Columnar dataset artifacts and the latest-dataset manifest.
+
+Pipeline stages used to hand each other pretty-printed JSON arrays. That
+format is several times larger than needed, and a reader has to parse every
+column to get at one. ``write_parquet`` streams records into a
+zstd-compressed Parquet file instead, one row group per batch.
+
+Column types come from one streaming pass over the records
+(``infer_schema``). Scalar columns keep their type. A column holding lists,
+dicts or mixed types, such as the LLM block's ``raw_response``, is stored as
+JSON text and listed in the schema metadata under ``json_columns``. Readers
+decode those columns back to Python objects, and only when the column is
+selected. ``read_dataset``, ``iter_parquet_batches`` and ``dataset_format``
+accept the older JSON arrays too, so consumers work with either format.
+
+Producers record finished datasets in ``datasets.manifest.json`` in the
+data directory (``register_dataset``). Consumers resolve "the latest
+dataset" through it (``latest_dataset``) instead of taking the last
+``*.json`` of a directory listing.
+"""
+
+import json
+from datetime import datetime, UTC
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+FORMATS = ("parquet", "json")
+COMPRESSION = "zstd"
+DEFAULT_BATCH_SIZE = 2000
+MANIFEST_NAME = "datasets.manifest.json"
+MANIFEST_VERSION = 1
+CONTENT_TYPES = {"parquet": "application/vnd.apache.parquet", "json": "application/json"}
+
+_JSON_COLUMNS_KEY = b"json_columns"
+_PARQUET_MAGIC = b"PAR1"
+_ARROW_TYPES = {"bool": pa.bool_(), "int": pa.int64(), "float": pa.float64(), "str": pa.string()}
+
+
+def dataset_format(path):
+    """``"parquet"`` or ``"json"``, from the file's magic bytes rather than its name.
+
+    KFP artifact paths carry no extension, so the suffix cannot be trusted.
+    """
+    with open(path, "rb") as f:
+        return "parquet" if f.read(4) == _PARQUET_MAGIC else "json"
+
+
+def _kind(value):
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, str):
+        return "str"
+    return "json"
+
+
+def infer_schema(records):
+    """Arrow schema for ``records``, from one pass that keeps no rows.
+
+    Columns appear in first-seen order. All-null columns become strings,
+    int/float mixes become float64, and anything else that is not one
+    scalar type is stored as JSON text.
+    """
+    kinds = {}
+    for record in records:
+        for field, value in record.items():
+            seen = kinds.setdefault(field, set())
+            kind = _kind(value)
+            if kind is not None:
+                seen.add(kind)
+
+    fields = []
+    json_columns = []
+    for field, seen in kinds.items():
+        if not seen:
+            seen = {"str"}
+        elif seen == {"int", "float"}:
+            seen = {"float"}
+        if len(seen) == 1 and "json" not in seen:
+            fields.append(pa.field(field, _ARROW_TYPES[seen.pop()]))
+        else:
+            fields.append(pa.field(field, pa.string()))
+            json_columns.append(field)
+    return pa.schema(fields, metadata={_JSON_COLUMNS_KEY: json.dumps(json_columns)})
+
+
+def json_columns(schema):
+    """Names of the columns stored as JSON text in ``schema``."""
+    metadata = schema.metadata or {}
+    return json.loads(metadata.get(_JSON_COLUMNS_KEY, b"[]"))
+
+
+def _dataframe_records(df, batch_size=DEFAULT_BATCH_SIZE):
+    # to_json per slice maps NaN/NaT to null without copying the whole frame
+    for start in range(0, len(df), batch_size):
+        yield from json.loads(df.iloc[start:start + batch_size].to_json(orient="records"))
+
+
+def _to_table(rows, schema, encoded):
+    columns = {}
+    for field in schema.names:
+        values = [row.get(field) for row in rows]
+        if field in encoded:
+            values = [None if v is None else json.dumps(v, ensure_ascii=False) for v in values]
+        columns[field] = values
+    return pa.Table.from_pydict(columns, schema=schema)
+
+
+def write_parquet(records, path, schema=None, batch_size=DEFAULT_BATCH_SIZE, compression=COMPRESSION):
+    """Stream records into a Parquet file, ``batch_size`` rows in memory at a time.
+
+    Parameters
+    ----------
+    records : Iterable[dict] | Callable[[], Iterable[dict]] | pd.DataFrame
+        Rows to write. Without ``schema`` they are read twice, once to infer
+        it, so pass a callable that returns a fresh iterator (or a list or
+        DataFrame) to keep a generator source streaming.
+    path : Path | str
+        Destination file; written to ``<path>.tmp`` and renamed on success.
+    schema : pa.Schema, optional
+        From :func:`infer_schema`. Keys missing from it are dropped.
+
+    Returns
+    -------
+    int
+        Number of rows written.
+    """
+    if hasattr(records, "iloc"):
+        df = records
+        records = lambda: _dataframe_records(df, batch_size)  # noqa: E731
+    elif not callable(records) and schema is None:
+        records = list(records)
+    source = records if callable(records) else (lambda: records)
+    if schema is None:
+        schema = infer_schema(source())
+    encoded = set(json_columns(schema))
+
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    count = 0
+    with pq.ParquetWriter(tmp, schema, compression=compression) as writer:
+        batch = []
+        for record in source():
+            batch.append(record)
+            if len(batch) == batch_size:
+                writer.write_table(_to_table(batch, schema, encoded))
+                count += len(batch)
+                batch = []
+        if batch or not count:
+            writer.write_table(_to_table(batch, schema, encoded))
+            count += len(batch)
+    tmp.replace(path)
+    return count
+
+
+def _decode(rows, columns):
+    for row in rows:
+        for field in columns:
+            if row.get(field) is not None:
+                row[field] = json.loads(row[field])
+    return rows
+
+
+def iter_parquet_batches(path, batch_size=DEFAULT_BATCH_SIZE, columns=None):
+    """Yield lists of record dicts from a Parquet file, JSON columns decoded."""
+    parquet = pq.ParquetFile(path)
+    encoded = [c for c in json_columns(parquet.schema_arrow) if columns is None or c in columns]
+    for batch in parquet.iter_batches(batch_size=batch_size, columns=columns):
+        yield _decode(batch.to_pylist(), encoded)
+
+
+def read_dataset(path, columns=None):
+    """Load a Parquet or JSON-array dataset as a DataFrame.
+
+    Parameters
+    ----------
+    columns : list[str], optional
+        Columns to load. With Parquet only these are read from disk, and
+        unselected JSON columns such as ``raw_response`` are never parsed.
+    """
+    import pandas as pd
+
+    if dataset_format(path) == "json":
+        df = pd.read_json(path)
+        return df if columns is None else df[[c for c in columns if c in df.columns]]
+
+    table = pq.read_table(path, columns=columns)
+    encoded = [c for c in json_columns(table.schema) if c in table.column_names]
+    df = table.drop_columns(encoded).to_pandas()
+    for field in encoded:
+        df[field] = [None if v is None else json.loads(v) for v in table.column(field).to_pylist()]
+    return df[table.column_names]
+
+
+def count_rows(path):
+    """Row count from the Parquet footer, or by parsing a JSON array."""
+    if dataset_format(path) == "parquet":
+        return pq.ParquetFile(path).metadata.num_rows
+    with open(path) as f:
+        return len(json.load(f))
+
+
+def _align(table, schema):
+    """``table`` with ``schema``'s columns, order and types; missing columns are null."""
+    columns = [
+        table.column(f.name).cast(f.type) if f.name in table.column_names else pa.nulls(table.num_rows, f.type)
+        for f in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def concat_parquet(paths, output_path, compression=COMPRESSION):
+    """Concatenate Parquet files with possibly different columns into one file.
+
+    Schemas are unified from the file footers; rows are then copied one row
+    group at a time. A column stored as JSON text in any input is JSON text
+    in the output, and plain strings from the other inputs are encoded to
+    match.
+
+    Returns
+    -------
+    int
+        Number of rows written.
+    """
+    files = [pq.ParquetFile(p) for p in paths]
+    schemas = [f.schema_arrow for f in files]
+    encoded = list(dict.fromkeys(c for s in schemas for c in json_columns(s)))
+    unified = pa.unify_schemas(
+        [s.remove_metadata() for s in schemas], promote_options="permissive"
+    ).with_metadata({_JSON_COLUMNS_KEY: json.dumps(encoded)})
+
+    output_path = Path(output_path)
+    tmp = output_path.with_name(output_path.name + ".tmp")
+    count = 0
+    with pq.ParquetWriter(tmp, unified, compression=compression) as writer:
+        for parquet, schema in zip(files, schemas):
+            reencode = [c for c in encoded if c in schema.names and c not in json_columns(schema)]
+            for i in range(parquet.num_row_groups):
+                group = parquet.read_row_group(i)
+                if reencode:
+                    rows = group.to_pylist()
+                    group = _to_table(_decode(rows, json_columns(schema)), unified, set(encoded))
+                else:
+                    group = _align(group, unified)
+                writer.write_table(group)
+                count += group.num_rows
+    tmp.replace(output_path)
+    return count
+
+
+# ── Manifest ───────────────────────────────────────────────────────────────────
+
+def read_manifest(directory):
+    path = Path(directory) / MANIFEST_NAME
+    if not path.exists():
+        return {"version": MANIFEST_VERSION, "latest": None, "datasets": {}}
+    return json.loads(path.read_text())
+
+
+def register_dataset(directory, path, rows=None, latest=True):
+    """Record ``path`` in the manifest of ``directory`` and mark it latest.
+
+    Files sharing a stem (``x.parquet`` and ``x.json``) are one dataset with
+    one file per format.
+
+    Returns
+    -------
+    dict
+        The dataset's manifest entry.
+    """
+    directory = Path(directory)
+    path = Path(path)
+    fmt = dataset_format(path)
+    manifest = read_manifest(directory)
+    entry = manifest["datasets"].setdefault(path.stem, {"files": {}})
+    entry["files"][fmt] = str(path.relative_to(directory) if path.is_relative_to(directory) else path)
+    entry["created"] = datetime.now(UTC).strftime("%Y-%m-%dT%H:%M:%SZ")
+    entry["rows"] = count_rows(path) if rows is None else rows
+    if fmt == "parquet":
+        entry["columns"] = pq.read_schema(path).names
+    if latest:
+        manifest["latest"] = path.stem
+
+    target = directory / MANIFEST_NAME
+    tmp = target.with_name(target.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2))
+    tmp.replace(target)
+    return entry
+
+
+def latest_dataset(directory, prefer=FORMATS):
+    """Path of the latest dataset in ``directory``, in the first available ``prefer`` format.
+
+    Falls back to the newest ``*.parquet`` / ``*.json`` by name for
+    directories written before the manifest existed.
+    """
+    directory = Path(directory)
+    manifest = read_manifest(directory)
+    entry = manifest["datasets"].get(manifest["latest"] or "")
+    if entry:
+        for fmt in prefer:
+            if fmt in entry["files"] and (directory / entry["files"][fmt]).exists():
+                return directory / entry["files"][fmt]
+
+    candidates = [
+        p for fmt in prefer for p in directory.glob(f"*.{fmt}")
+        if p.name != MANIFEST_NAME
+    ]
+    if not candidates:
+        raise FileNotFoundError(f"No datasets found in {directory}")
+    newest = max(p.stem for p in candidates)
+    return next(p for p in candidates if p.stem == newest)
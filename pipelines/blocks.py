@@ -0,0 +1,66 @@
+"""Custom sdg_hub blocks used by ``data/flow.yaml``.
+
+Import this module before ``Flow.from_yaml`` so the blocks are registered::
+
+    import pipelines.blocks  # noqa: F401
+"""
+
+from typing import Literal, Optional
+
+import pandas as pd
+from pydantic import Field, model_validator
+from sdg_hub.core.blocks.base import BaseBlock
+from sdg_hub.core.blocks.registry import BlockRegistry
+
+from pipelines.sampling import sample_attributes
+
+
+@BlockRegistry.register(
+    "AttributeSamplerBlock",
+    "transform",
+    "Expands each row and samples one value from every pool column in a single vectorized pass",
+)
+class AttributeSamplerBlock(BaseBlock):
+    """Row expansion plus multi-dimensional attribute sampling in one block.
+
+    Replaces a RowMultiplierBlock followed by one SamplerBlock per dimension.
+    ``input_cols[i]`` (a list or weighted-dict pool) is sampled into
+    ``output_cols[i]``; pool columns missing from the dataset are skipped.
+    See ``pipelines.sampling`` for the sampling modes.
+    """
+
+    num_samples: Optional[int] = Field(
+        30,
+        description="Rows per input row; an upper bound in pairwise mode (null = until covered)",
+    )
+    mode: Literal["independent", "stratified", "pairwise"] = Field(
+        "stratified", description="Sampling strategy"
+    )
+    seed: Optional[int] = Field(None, description="Random seed for reproducible draws")
+    candidates: int = Field(64, description="Candidate rows scored per step in pairwise mode")
+
+    @model_validator(mode="after")
+    def _check_columns(self):
+        if len(self.input_cols) != len(self.output_cols):
+            raise ValueError(
+                f"input_cols and output_cols must pair up, got {len(self.input_cols)} "
+                f"pool columns and {len(self.output_cols)} output columns"
+            )
+        return self
+
+    def generate(self, samples: pd.DataFrame, **kwargs) -> pd.DataFrame:
+        present = [(i, o) for i, o in zip(self.input_cols, self.output_cols) if i in samples.columns]
+        if not present:
+            return samples.loc[samples.index.repeat(self.num_samples or 1)].reset_index(drop=True)
+
+        concept_of_row, values = sample_attributes(
+            [samples[pool_col].tolist() for pool_col, _ in present],
+            num_samples=self.num_samples,
+            mode=self.mode,
+            seed=self.seed,
+            candidates=self.candidates,
+        )
+        result = samples.iloc[concept_of_row].reset_index(drop=True)
+        for (_, output_col), column in zip(present, values):
+            result[output_col] = column
+        return result
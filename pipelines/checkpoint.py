@@ -0,0 +1,252 @@
+"""Checkpointed, resumable flow generation.
+
+``flow.generate(df)`` keeps every row in memory until the last LLM call
+returns, so a crash near the end loses the whole run. ``generate_checkpointed``
+instead:
+
+1. runs the cheap, model-free head of the flow (row replication, samplers,
+   prompt building) once and gives every expanded row a stable ``row_id``;
+2. runs the rest of the flow in batches, appending each finished batch to an
+   append-only JSONL checkpoint;
+3. on restart, skips every ``row_id`` already in the checkpoint.
+
+Rows are checkpointed in dataset order. ``write_parquet_from_checkpoint``
+and ``write_json_from_checkpoint`` stream the checkpoint into a Parquet file
+or the older pretty-printed JSON array without loading it as a DataFrame.
+
+With ``prefix_ordered=True`` pending rows are sent in prefix-cache order
+instead (see ``pipelines.prefix_cache``). The checkpoint is then not in
+dataset order, and the writers restore it from the returned row ids.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from pipelines.prefix_cache import prefix_order
+
+ROW_ID = "row_id"
+_SOURCE_ID = "_source_id"
+
+
+def split_flow(flow):
+    """Split ``flow`` at its first LLM block.
+
+    Returns
+    -------
+    tuple[Flow, Flow]
+        ``(head, tail)``: ``head`` makes no model calls, ``tail`` starts with
+        the first ``LLM*`` block. Both share the configured model settings.
+    """
+    for i, block in enumerate(flow.blocks):
+        if type(block).__name__.startswith("LLM"):
+            break
+    else:
+        raise ValueError("Flow has no LLM block to checkpoint around")
+    head = flow.model_copy(update={"blocks": flow.blocks[:i]})
+    tail = flow.model_copy(update={"blocks": flow.blocks[i:]})
+    return head, tail
+
+
+def _source_ids(df):
+    """Content hash per input row, suffixed with its occurrence among equal rows."""
+    digests = [
+        hashlib.sha1(json.dumps(row, sort_keys=True, default=str).encode()).hexdigest()[:16]
+        for row in df.to_dict(orient="records")
+    ]
+    seen = {}
+    ids = []
+    for digest in digests:
+        ids.append(f"{digest}.{seen.get(digest, 0)}")
+        seen[digest] = seen.get(digest, 0) + 1
+    return ids
+
+
+def assign_row_ids(flow_head, df, **generate_kwargs):
+    """Run the model-free head of the flow and tag each output row with ``row_id``.
+
+    The id is ``<source row hash>.<n>-<k>``: the k-th expansion of the n-th
+    copy of an input row, so it is stable across restarts as long as the
+    input dataset and the expansion factor are unchanged.
+    """
+    df = df.copy()
+    df[_SOURCE_ID] = _source_ids(df)
+    expanded = flow_head.generate(df, **generate_kwargs) if flow_head.blocks else df
+    expanded = expanded.reset_index(drop=True)
+    replica = expanded.groupby(_SOURCE_ID, sort=False).cumcount()
+    expanded[ROW_ID] = expanded[_SOURCE_ID] + "-" + replica.astype(str)
+    return expanded.drop(columns=[_SOURCE_ID])
+
+
+def completed_row_ids(checkpoint_path):
+    """Return the set of row ids in the checkpoint, repairing a torn last line."""
+    checkpoint_path = Path(checkpoint_path)
+    done = set()
+    if not checkpoint_path.exists():
+        return done
+
+    good_offset = 0
+    with checkpoint_path.open("rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break  # partial write from a crash; everything after is dropped
+            done.add(record[ROW_ID])
+            good_offset += len(line)
+    if good_offset != checkpoint_path.stat().st_size:
+        with checkpoint_path.open("r+b") as f:
+            f.truncate(good_offset)
+    return done
+
+
+def _append(checkpoint_path, batch):
+    if batch.empty:
+        return
+    text = batch.to_json(orient="records", lines=True)
+    with Path(checkpoint_path).open("a") as f:
+        f.write(text if text.endswith("\n") else text + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _pool_columns(columns):
+    return [c for c in columns if c.endswith("_pool")]
+
+
+def generate_checkpointed(flow, df, checkpoint_path, batch_size=64, drop_cols=None,
+                          prefix_ordered=False, prompt_col="generation_prompt", **generate_kwargs):
+    """Generate ``df`` through ``flow``, streaming finished rows to ``checkpoint_path``.
+
+    Parameters
+    ----------
+    flow : Flow
+        A configured sdg_hub flow (``set_model_config`` already called).
+    df : pd.DataFrame
+        Input dataset, as passed to ``flow.generate``.
+    checkpoint_path : Path | str
+        Append-only JSONL file. Rows already in it are not regenerated.
+    batch_size : int
+        Rows per ``flow.generate`` call on the LLM part of the flow. Bounds
+        both memory use and the work lost on a crash.
+    drop_cols : callable, optional
+        Maps a column index to the columns dropped before checkpointing.
+        Defaults to the ``*_pool`` input columns, which are not part of the
+        generated output.
+    prefix_ordered : bool
+        Send pending rows sorted by ``prompt_col`` so rows sharing a prompt
+        prefix reach the model back to back. Off by default: with
+        ``data/prompt_template.yaml`` rows of a concept are already adjacent
+        in dataset order (see ``benchmarks/prefix_cache.py``).
+    prompt_col : str
+        Rendered prompt column ``prefix_ordered`` sorts by.
+    **generate_kwargs
+        Forwarded to ``flow.generate`` (e.g. ``max_concurrency``).
+
+    Returns
+    -------
+    list[str] | None
+        With ``prefix_ordered``, every row id in dataset order, for the
+        ``row_ids`` of ``write_*_from_checkpoint``; otherwise None, as the
+        checkpoint is already in dataset order.
+    """
+    checkpoint_path = Path(checkpoint_path)
+    checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+    drop_cols = drop_cols or _pool_columns
+
+    head, tail = split_flow(flow)
+    expanded = assign_row_ids(head, df, **generate_kwargs)
+    expanded = expanded.drop(columns=drop_cols(expanded.columns), errors="ignore")
+
+    row_ids = expanded[ROW_ID].tolist() if prefix_ordered else None
+    done = completed_row_ids(checkpoint_path)
+    pending = expanded[~expanded[ROW_ID].isin(done)]
+    if prefix_ordered and prompt_col in pending.columns:
+        pending = pending.iloc[prefix_order(pending[prompt_col].tolist())]
+    print(f"Checkpoint {checkpoint_path}: {len(done)} rows done, {len(pending)} to generate")
+    del expanded
+
+    generated = 0
+    for start in range(0, len(pending), batch_size):
+        batch = pending.iloc[start:start + batch_size]
+        result = tail.generate(batch, **generate_kwargs)
+        result = result.drop(columns=drop_cols(result.columns), errors="ignore")
+        _append(checkpoint_path, result)
+        generated += len(batch)
+        print(f"Checkpointed {generated}/{len(pending)} rows")
+    return row_ids
+
+
+def iter_checkpoint(checkpoint_path):
+    """Yield checkpoint records one at a time."""
+    with Path(checkpoint_path).open() as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _iter_in_order(checkpoint_path, row_ids):
+    """Yield checkpoint records ordered by ``row_ids``, seeking by byte offset."""
+    offsets = {}
+    with Path(checkpoint_path).open("rb") as f:
+        offset = 0
+        for line in f:
+            if line.strip():
+                offsets.setdefault(json.loads(line)[ROW_ID], []).append(offset)
+            offset += len(line)
+        for row_id in row_ids:
+            for start in offsets.get(row_id, ()):
+                f.seek(start)
+                yield json.loads(f.readline())
+
+
+def write_json_from_checkpoint(checkpoint_path, output_path, indent=2, row_ids=None):
+    """Stream the checkpoint into a JSON array file, one record in memory at a time.
+
+    Parameters
+    ----------
+    row_ids : list[str], optional
+        Output order, as returned by ``generate_checkpointed``. Records are
+        written in checkpoint order when omitted.
+
+    Returns
+    -------
+    int
+        Number of records written.
+    """
+    records = (
+        iter_checkpoint(checkpoint_path) if row_ids is None
+        else _iter_in_order(checkpoint_path, row_ids)
+    )
+    count = 0
+    with Path(output_path).open("w") as out:
+        out.write("[")
+        for record in records:
+            out.write(",\n" if count else "\n")
+            text = json.dumps(record, indent=indent, ensure_ascii=False)
+            out.write("\n".join(" " * indent + line for line in text.splitlines()))
+            count += 1
+        out.write("\n]\n" if count else "]\n")
+    return count
+
+
+def write_parquet_from_checkpoint(checkpoint_path, output_path, row_ids=None):
+    """Stream the checkpoint into a Parquet file (see ``pipelines.artifacts``).
+
+    The schema is inferred in checkpoint order first, so no record is held
+    longer than one row group.
+
+    Returns
+    -------
+    int
+        Number of records written.
+    """
+    from pipelines import artifacts
+
+    schema = artifacts.infer_schema(iter_checkpoint(checkpoint_path))
+    records = (
+        iter_checkpoint(checkpoint_path) if row_ids is None
+        else _iter_in_order(checkpoint_path, row_ids)
+    )
+    return artifacts.write_parquet(records, output_path, schema=schema)
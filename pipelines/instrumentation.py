@@ -0,0 +1,286 @@
+"""Per-stage performance counters for flow blocks and garak probes.
+
+``StageMetrics`` keeps one set of counters per stage name: a block of
+``data/flow.yaml`` during generation, or a garak probe (see
+``tools/garak_metrics.py``). Each set holds:
+
+``calls``, ``seconds``
+    Executions of the stage and their total wall time.
+``rows_in``, ``rows_out``
+    Rows the stage received and returned.
+``requests``, ``retries``, ``errors``
+    LLM request attempts made while the stage was running. Retryable
+    failures (throttling, timeouts, see ``pipelines.scheduler.is_retryable``)
+    count as ``retries``, anything else as ``errors``.
+``prompt_tokens``, ``completion_tokens``
+    From the ``usage`` of successful responses.
+
+The running stage is held in a context variable, so requests are charged to
+the block that made them, including requests sent from asyncio tasks the
+block spawned.
+
+Usage::
+
+    from pipelines import instrumentation
+
+    metrics = instrumentation.StageMetrics()
+    instrumentation.install(metrics, flow)   # before scheduler.install
+    flow.generate(df)
+    print(metrics.format_table())
+
+Install it before :func:`pipelines.scheduler.install` and
+:func:`pipelines.llm_cache.install`, so every retry attempt is seen and
+cache hits are not counted as requests.
+"""
+
+import contextlib
+import contextvars
+import json
+import threading
+import time
+from pathlib import Path
+
+from pipelines import _litellm
+from pipelines.scheduler import RETRY_STATUSES, is_retryable
+
+COUNTERS = (
+    "calls",
+    "seconds",
+    "rows_in",
+    "rows_out",
+    "requests",
+    "retries",
+    "errors",
+    "prompt_tokens",
+    "completion_tokens",
+)
+# Requests made outside any instrumented stage
+UNATTRIBUTED = "(unattributed)"
+
+_current_stage = contextvars.ContextVar("current_stage", default=None)
+
+
+def current_stage():
+    """Name of the stage running in this context, or None."""
+    return _current_stage.get()
+
+
+def _usage(response):
+    usage = response.get("usage") if isinstance(response, dict) else getattr(response, "usage", None)
+    if usage is None:
+        return 0, 0
+    if isinstance(usage, dict):
+        return usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0
+    return getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0
+
+
+class StageMetrics:
+    """Thread-safe counters per stage, in first-seen stage order."""
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, **counters):
+        """Add ``counters`` to ``stage``; names outside ``COUNTERS`` are kept too."""
+        with self._lock:
+            totals = self.stages.setdefault(stage, dict.fromkeys(COUNTERS, 0))
+            for name, value in counters.items():
+                totals[name] = totals.get(name, 0) + value
+
+    @contextlib.contextmanager
+    def stage(self, name, rows_in=0, timer="calls", clock="seconds"):
+        """Time one execution of ``name`` and charge requests made inside it to it.
+
+        Yields a dict; set ``"rows_out"`` (or any other counter) in it before
+        the block exits. ``timer`` and ``clock`` name the counters that get
+        the execution and its wall time, for a second phase of a stage.
+        """
+        token = _current_stage.set(name)
+        extra = {}
+        start = time.perf_counter()
+        try:
+            yield extra
+        finally:
+            _current_stage.reset(token)
+            extra.update({timer: 1, clock: time.perf_counter() - start})
+            self.add(name, rows_in=rows_in, **extra)
+
+    def record_request(self, response=None, exc=None, stage=None):
+        """Count one LLM request attempt against ``stage`` (default: the current one)."""
+        stage = stage or current_stage() or UNATTRIBUTED
+        if exc is not None:
+            self.add(stage, requests=1, **{"retries" if is_retryable(exc) else "errors": 1})
+            return
+        prompt_tokens, completion_tokens = _usage(response)
+        self.add(stage, requests=1, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def record_status(self, status, stage=None):
+        """Count one HTTP request attempt by its status code, without tokens."""
+        stage = stage or current_stage() or UNATTRIBUTED
+        if status < 400:
+            self.add(stage, requests=1)
+        else:
+            self.add(stage, requests=1, **{"retries" if status in RETRY_STATUSES else "errors": 1})
+
+    def record_tokens(self, response, stage=None):
+        """Add the ``usage`` of ``response`` without counting a request."""
+        prompt_tokens, completion_tokens = _usage(response)
+        self.add(stage or current_stage() or UNATTRIBUTED,
+                 prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def to_dict(self):
+        with self._lock:
+            return {stage: dict(counters) for stage, counters in self.stages.items()}
+
+    @classmethod
+    def merge(cls, dicts):
+        """Sum several :meth:`to_dict` results (e.g. one per shard)."""
+        merged = cls()
+        for stages in dicts:
+            for stage, counters in stages.items():
+                merged.add(stage, **counters)
+        return merged
+
+    def totals(self):
+        """Every counter summed over all stages."""
+        totals = dict.fromkeys(COUNTERS, 0)
+        for counters in self.to_dict().values():
+            for name, value in counters.items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    # ── export ───────────────────────────────────────────────────────────────
+
+    def log_kfp(self, metrics, prefix=""):
+        """Log every counter as ``<prefix><stage>.<counter>`` on a KFP ``Metrics`` artifact."""
+        for stage, counters in self.to_dict().items():
+            for name, value in counters.items():
+                metrics.log_metric(f"{prefix}{stage}.{name}", round(float(value), 6))
+
+    def to_prometheus(self, namespace, label):
+        """Prometheus text exposition, one counter family per field, labelled by stage."""
+        stages = self.to_dict()
+        names = list(dict.fromkeys(name for counters in stages.values() for name in counters))
+        lines = []
+        for name in names:
+            metric = f"{namespace}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for stage, counters in stages.items():
+                escaped = stage.replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'{metric}{{{label}="{escaped}"}} {counters.get(name, 0)}')
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path):
+        _write_atomic(path, json.dumps(self.to_dict(), indent=2))
+
+    def write_prometheus(self, path, namespace, label):
+        """Write a node-exporter textfile; renamed into place so it is never read half-written."""
+        _write_atomic(path, self.to_prometheus(namespace, label))
+
+    def format_table(self, label="stage"):
+        """Fixed-width per-stage summary lines."""
+        stages = self.to_dict()
+        width = max([len(label)] + [len(s) for s in stages])
+        lines = [
+            f"{label:<{width}}  {'calls':>6} {'seconds':>9} {'rows in':>8} {'rows out':>8} "
+            f"{'requests':>8} {'retries':>7} {'errors':>6} {'prompt tok':>10} {'compl tok':>10}"
+        ]
+        for stage, c in stages.items():
+            lines.append(
+                f"{stage:<{width}}  {c['calls']:>6} {c['seconds']:>9.2f} {c['rows_in']:>8} {c['rows_out']:>8} "
+                f"{c['requests']:>8} {c['retries']:>7} {c['errors']:>6} "
+                f"{c['prompt_tokens']:>10} {c['completion_tokens']:>10}"
+            )
+        return lines
+
+
+def _write_atomic(path, text):
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text)
+    tmp.replace(path)
+
+
+# ── sdg_hub flows ──────────────────────────────────────────────────────────────
+
+def instrument_blocks(metrics, blocks):
+    """Time ``generate`` of every block in ``blocks`` under its ``block_name``.
+
+    Patches each distinct block class once. A block whose ``generate`` calls
+    its parent's is only counted once. Returns an undo function.
+    """
+    undos = []
+    for cls in dict.fromkeys(type(block) for block in blocks):
+        original = cls.__dict__.get("generate")
+        inherited = cls.generate
+
+        def generate(self, samples, *args, _inherited=inherited, **kwargs):
+            name = self.block_name
+            if current_stage() == name:
+                return _inherited(self, samples, *args, **kwargs)
+            with metrics.stage(name, rows_in=len(samples)) as extra:
+                result = _inherited(self, samples, *args, **kwargs)
+                extra["rows_out"] = len(result)
+            return result
+
+        setattr(cls, "generate", generate)
+        if original is None:
+            undos.append(lambda cls=cls: delattr(cls, "generate"))
+        else:
+            undos.append(lambda cls=cls, original=original: setattr(cls, "generate", original))
+
+    def undo():
+        for restore in reversed(undos):
+            restore()
+
+    return undo
+
+
+def install_litellm(metrics):
+    """Count litellm request attempts and tokens against the running stage."""
+
+    def wrap_sync(original):
+        def completion(*args, **kwargs):
+            try:
+                response = original(*args, **kwargs)
+            except Exception as exc:
+                metrics.record_request(exc=exc)
+                raise
+            metrics.record_request(response)
+            return response
+
+        return completion
+
+    def wrap_async(original):
+        async def acompletion(*args, **kwargs):
+            try:
+                response = await original(*args, **kwargs)
+            except Exception as exc:
+                metrics.record_request(exc=exc)
+                raise
+            metrics.record_request(response)
+            return response
+
+        return acompletion
+
+    undo_sync = _litellm.patch("completion", wrap_sync)
+    undo_async = _litellm.patch("acompletion", wrap_async)
+
+    def undo():
+        undo_sync()
+        undo_async()
+
+    return undo
+
+
+def install(metrics, flow):
+    """Instrument the blocks of ``flow`` and litellm. Returns an undo function."""
+    undo_blocks = instrument_blocks(metrics, flow.blocks)
+    undo_litellm = install_litellm(metrics)
+
+    def undo():
+        undo_litellm()
+        undo_blocks()
+
+    return undo
@@ -0,0 +1,258 @@
+"""Persistent, content-addressed cache for the flow's LLM calls.
+
+Every ``generate_adversarial_prompt`` request in ``data/flow.yaml`` is keyed on
+a SHA-256 of the model, api_base, rendered messages, ``response_format``
+schema and sampling parameters. Responses are stored in a SQLite file so a
+re-run with unchanged inputs (e.g. after a failure in the S3 step) makes no
+model calls at all.
+
+Usage::
+
+    from pipelines import llm_cache
+
+    cache = llm_cache.LLMResponseCache("~/.cache/rh-summit-demos/llm")
+    llm_cache.install(cache)
+    result = flow.generate(df)
+    print(cache.stats())
+
+Set ``replay_only=True`` (or ``LLM_CACHE_REPLAY_ONLY=1``) to raise
+:class:`CacheMiss` instead of calling the model, which makes flow runs
+deterministic for tests.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from pipelines import _litellm
+
+DEFAULT_CACHE_DIR = (
+    Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "rh-summit-demos" / "llm"
+)
+
+# Request parameters that change the completion. Credentials, timeouts and
+# retry settings are deliberately left out of the key.
+KEY_PARAMS = (
+    "model",
+    "api_base",
+    "base_url",
+    "messages",
+    "response_format",
+    "temperature",
+    "top_p",
+    "top_k",
+    "max_tokens",
+    "max_completion_tokens",
+    "n",
+    "seed",
+    "stop",
+    "presence_penalty",
+    "frequency_penalty",
+    "logprobs",
+    "extra_body",
+)
+
+# Run eviction every this many writes rather than on every put.
+_EVICT_EVERY = 64
+
+
+class CacheMiss(LookupError):
+    """Raised in replay-only mode when a request is not in the cache."""
+
+
+class LLMResponseCache:
+    """SQLite-backed LLM response store with size and age based eviction.
+
+    Parameters
+    ----------
+    cache_dir : Path | str
+        Directory holding ``responses.sqlite``. Created if missing.
+    max_bytes : int, optional
+        Evict least recently used entries once the stored payloads exceed this.
+    max_age_seconds : float, optional
+        Entries older than this are treated as misses and evicted.
+    replay_only : bool
+        Never call the model; raise :class:`CacheMiss` on a miss.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=None, max_age_seconds=None,
+                 replay_only=False):
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.replay_only = replay_only
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.cache_dir / "responses.sqlite", check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._db.commit()
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache from ``LLM_CACHE_*`` environment variables.
+
+        ``LLM_CACHE_DIR``, ``LLM_CACHE_MAX_MB``, ``LLM_CACHE_MAX_AGE_DAYS`` and
+        ``LLM_CACHE_REPLAY_ONLY`` map onto the constructor arguments.
+        """
+        max_mb = os.environ.get("LLM_CACHE_MAX_MB")
+        max_age_days = os.environ.get("LLM_CACHE_MAX_AGE_DAYS")
+        return cls(
+            cache_dir=os.environ.get("LLM_CACHE_DIR", DEFAULT_CACHE_DIR),
+            max_bytes=int(float(max_mb) * 1024 * 1024) if max_mb else None,
+            max_age_seconds=float(max_age_days) * 86400 if max_age_days else None,
+            replay_only=os.environ.get("LLM_CACHE_REPLAY_ONLY", "") not in ("", "0", "false"),
+        )
+
+    @staticmethod
+    def key(request):
+        """Content hash of the parameters in ``KEY_PARAMS``."""
+        keyed = {name: request[name] for name in KEY_PARAMS if request.get(name) is not None}
+        canonical = json.dumps(keyed, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get(self, key):
+        """Return the cached response dict for ``key``, or None."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self._expired(row[1], now):
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, response):
+        """Store a response dict under ``key``."""
+        payload = json.dumps(response, separators=(",", ":"), default=str)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now),
+            )
+            self._db.commit()
+            self._writes += 1
+            if self._writes % _EVICT_EVERY == 0:
+                self._evict(now)
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones above ``max_bytes``."""
+        with self._lock:
+            self._evict(time.time())
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _expired(self, created_at, now):
+        return self.max_age_seconds is not None and now - created_at > self.max_age_seconds
+
+    def _evict(self, now):
+        if self.max_age_seconds is not None:
+            self._db.execute(
+                "DELETE FROM responses WHERE created_at < ?", (now - self.max_age_seconds,)
+            )
+        if self.max_bytes is not None:
+            (total,) = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+            excess = total - self.max_bytes
+            if excess > 0:
+                doomed = []
+                for key, size in self._db.execute(
+                    "SELECT key, size FROM responses ORDER BY accessed_at"
+                ):
+                    doomed.append((key,))
+                    excess -= size
+                    if excess <= 0:
+                        break
+                self._db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self._db.commit()
+
+
+def _to_dict(response):
+    return response.model_dump() if hasattr(response, "model_dump") else dict(response)
+
+
+def _from_dict(data):
+    import litellm
+
+    return litellm.ModelResponse(**data)
+
+
+def install(cache):
+    """Route litellm completions through ``cache``.
+
+    Streaming requests bypass the cache. Returns an undo function.
+    """
+
+    def lookup(request):
+        if request.get("stream"):
+            return None, None
+        key = cache.key(request)
+        hit = cache.get(key)
+        if hit is None and cache.replay_only:
+            raise CacheMiss(f"No cached response for request {key[:12]} (replay-only mode)")
+        return key, hit
+
+    def wrap_sync(original):
+        def completion(*args, **kwargs):
+            key, hit = lookup(_litellm.request_kwargs(args, kwargs))
+            if hit is not None:
+                return _from_dict(hit)
+            response = original(*args, **kwargs)
+            if key is not None:
+                cache.put(key, _to_dict(response))
+            return response
+
+        return completion
+
+    def wrap_async(original):
+        async def acompletion(*args, **kwargs):
+            key, hit = lookup(_litellm.request_kwargs(args, kwargs))
+            if hit is not None:
+                return _from_dict(hit)
+            response = await original(*args, **kwargs)
+            if key is not None:
+                cache.put(key, _to_dict(response))
+            return response
+
+        return acompletion
+
+    undo_sync = _litellm.patch("completion", wrap_sync)
+    undo_async = _litellm.patch("acompletion", wrap_async)
+
+    def undo():
+        undo_sync()
+        undo_async()
+
+    return undo
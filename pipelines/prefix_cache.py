@@ -0,0 +1,82 @@
+"""Request ordering for vLLM automatic prefix caching.
+
+vLLM caches the KV blocks of every prompt prefix it has prefilled, so a
+request whose leading tokens match an earlier one only pays prefill for the
+rest. Sending rows in lexicographic order of their rendered prompt puts
+rows with the longest common prefixes next to each other while those blocks
+are still cached. ``data/prompt_template.yaml`` keeps the per-concept text
+first and the sampled attributes last, so this groups rows by concept and
+then by attribute values.
+
+Most of the saving comes from the template layout alone, which already
+keeps a concept's rows adjacent in dataset order; ``generate_checkpointed``
+therefore only reorders with ``prefix_ordered=True``.
+``simulate_prefix_cache`` estimates what a template and an order save, see
+``benchmarks/prefix_cache.py``.
+"""
+
+import hashlib
+from collections import OrderedDict
+
+
+def prompt_text(messages):
+    """Flatten a chat prompt (list of ``{"role", "content"}``) into one sort key."""
+    if isinstance(messages, str):
+        return messages
+    return "\x00".join(f"{m.get('role', '')}\x01{m.get('content', '')}" for m in messages)
+
+
+def prefix_order(prompts):
+    """Permutation that sends prompts sharing long prefixes back to back.
+
+    Returns
+    -------
+    list[int]
+        Positions into ``prompts``, in send order.
+    """
+    keys = [prompt_text(p) for p in prompts]
+    return sorted(range(len(keys)), key=keys.__getitem__)
+
+
+def simulate_prefix_cache(token_lists, block_size=16, capacity_blocks=None):
+    """Replay requests through an LRU block cache like vLLM's.
+
+    Only whole ``block_size`` token blocks are cached, keyed by a hash of the
+    full prefix up to and including the block.
+
+    Parameters
+    ----------
+    token_lists : Iterable[Sequence]
+        Tokenized prompts, in send order.
+    block_size : int
+        KV cache block size in tokens (vLLM's default is 16).
+    capacity_blocks : int, optional
+        Cache capacity; unbounded when None.
+
+    Returns
+    -------
+    dict
+        ``prompt_tokens``, ``cached_tokens`` and ``prefill_tokens`` totals.
+    """
+    cache = OrderedDict()
+    prompt_tokens = cached_tokens = 0
+    for tokens in token_lists:
+        prompt_tokens += len(tokens)
+        digest = hashlib.sha1()
+        hit = True
+        for start in range(0, len(tokens) - block_size + 1, block_size):
+            digest.update("\x00".join(map(str, tokens[start:start + block_size])).encode())
+            key = digest.copy().hexdigest()
+            if hit and key in cache:
+                cached_tokens += block_size
+                cache.move_to_end(key)
+                continue
+            hit = False
+            cache[key] = True
+            if capacity_blocks is not None and len(cache) > capacity_blocks:
+                cache.popitem(last=False)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": cached_tokens,
+        "prefill_tokens": prompt_tokens - cached_tokens,
+    }
@@ -13,12 +13,30 @@ Run:
     export AWS_ACCESS_KEY_ID=...
     export AWS_SECRET_ACCESS_KEY=...
     python -m pipelines.red_team_pipeline
+
+Generation is fanned out over shards of the base dataset (one policy concept
+per shard by default, see ``rows_per_shard``). Set MAX_PARALLEL_SHARDS to cap
+how many generation pods hit the model server at once.
+
+Shards run the repo's ``data/flow.yaml`` (FLOW_PATH, relative to the repo
+root); set FLOW_ID to run a flow from the sdg_hub registry instead. Set
+PREFIX_ORDERED=1 to send each shard's requests sorted by prompt
+(see pipelines/prefix_cache.py).
+
+Datasets pass between components as zstd Parquet (see pipelines/artifacts.py);
+set ARTIFACT_FORMAT=json for the previous JSON arrays. The final dataset is
+stored in S3 by content hash, so a run that reproduces an earlier dataset only
+writes a pointer (see pipelines/s3_upload.py). AWS_S3_KEY therefore names
+that small JSON pointer, not the data; the upload step prints both keys and
+returns them as its ``object_key`` and ``pointer_key`` outputs. AWS_S3_PREFIX
+and AWS_S3_ENDPOINT (e.g. MinIO) are optional.
 """
 
 import os
+from typing import List, NamedTuple
 
 from kfp import dsl
-from kfp.dsl import Dataset, Input, Output
+from kfp.dsl import Dataset, Input, Metrics, Output
 
 # ── Configuration ──────────────────────────────────────────────────────────────
 
@@ -29,13 +47,35 @@ PIPELINE_IMAGE = "quay.io/rh-ee-hnunes/summit-demo-bench:latest"
 
 PACKAGES_TO_INSTALL = []
 
+# Upper bound on concurrently running generation shards. KFP bakes this into
+# the compiled pipeline, so it is read from the environment at submit time.
+MAX_PARALLEL_SHARDS = int(os.environ.get("MAX_PARALLEL_SHARDS", "4"))
+
+# A failed shard is retried on its own instead of failing the whole run.
+SHARD_RETRIES = 2
+
+# Optional PVC holding the persistent LLM response cache (see pipelines/llm_cache.py).
+# When set, it is mounted into every generation shard at LLM_CACHE_MOUNT.
+LLM_CACHE_PVC = os.environ.get("LLM_CACHE_PVC", "")
+LLM_CACHE_MOUNT = "/llm-cache"
+
+# Generation checkpoints live on the same PVC so a retried shard pod resumes
+# from the rows its predecessor already finished.
+CHECKPOINT_MOUNT = LLM_CACHE_MOUNT + "/checkpoints"
+
+# Format of the datasets passed between components and uploaded to S3:
+# "parquet" (zstd, see pipelines/artifacts.py) or "json".
+ARTIFACT_FORMAT = os.environ.get("ARTIFACT_FORMAT", "parquet")
+
 
 # ── Components ─────────────────────────────────────────────────────────────────
 
 @dsl.component(base_image=PIPELINE_IMAGE, packages_to_install=PACKAGES_TO_INSTALL)
-def create_base_dataset(dataset: Output[Dataset]):
+def create_base_dataset(dataset: Output[Dataset], artifact_format: str = "parquet"):
     import json
 
+    from pipelines import artifacts
+
     base_data = [
         {
             "policy_concept": "Illegal Activity",
@@ -135,43 +175,148 @@ def create_base_dataset(dataset: Output[Dataset]):
         },
     ]
 
-    with open(dataset.path, "w") as f:
-        json.dump(base_data, f, indent=2)
+    if artifact_format == "parquet":
+        artifacts.write_parquet(base_data, dataset.path)
+    else:
+        with open(dataset.path, "w") as f:
+            json.dump(base_data, f, indent=2)
+    dataset.metadata["format"] = artifact_format
 
     print(f"Created base dataset with {len(base_data)} policy concepts")
 
 
+@dsl.component(base_image=PIPELINE_IMAGE, packages_to_install=PACKAGES_TO_INSTALL)
+def plan_shards(base_dataset: Input[Dataset], rows_per_shard: int = 1) -> list:
+    """Split the base dataset into shards of ``rows_per_shard`` consecutive rows.
+
+    With the default of 1 every policy concept gets its own shard. Returns a
+    list of ``{"shard_id": int, "rows": [row indices]}`` for ``dsl.ParallelFor``.
+    """
+    from pipelines import artifacts
+
+    if rows_per_shard < 1:
+        raise ValueError(f"rows_per_shard must be >= 1, got {rows_per_shard}")
+
+    n_rows = artifacts.count_rows(base_dataset.path)
+    shards = [
+        {"shard_id": shard_id, "rows": list(range(start, min(start + rows_per_shard, n_rows)))}
+        for shard_id, start in enumerate(range(0, n_rows, rows_per_shard))
+    ]
+
+    print(f"Planned {len(shards)} shards of up to {rows_per_shard} rows")
+    return shards
+
+
 @dsl.component(base_image=PIPELINE_IMAGE, packages_to_install=PACKAGES_TO_INSTALL)
 def generate_red_team_prompts(
         base_dataset: Input[Dataset],
         prompts_dataset: Output[Dataset],
+        metrics: Output[Metrics],
         model: str,
         api_base: str,
-        flow_id: str = "major-sage-742",
+        shard: dict,
+        flow_path: str = "data/flow.yaml",
+        flow_id: str = "",
+        llm_cache_dir: str = "",
+        checkpoint_dir: str = "",
+        run_id: str = "",
+        batch_size: int = 64,
+        max_concurrency: int = 64,
+        prefix_ordered: bool = False,
+        artifact_format: str = "parquet",
 ):
-    import json
+    import tempfile
+    from pathlib import Path
+
     import nest_asyncio
-    import pandas as pd
     from sdg_hub import FlowRegistry, Flow
 
+    import pipelines
+    import pipelines.blocks  # noqa: F401  registers AttributeSamplerBlock for the flow
+    from pipelines import artifacts, instrumentation, scheduler
+    from pipelines.checkpoint import (
+        generate_checkpointed,
+        write_json_from_checkpoint,
+        write_parquet_from_checkpoint,
+    )
+
     nest_asyncio.apply()
 
-    with open(base_dataset.path) as f:
-        base_data = json.load(f)
-    df = pd.DataFrame(base_data)
+    # Innermost litellm wrapper, so it sees every retry attempt and no cache hits
+    block_metrics = instrumentation.StageMetrics()
+    instrumentation.install_litellm(block_metrics)
+
+    # Concurrency adapts to the endpoint between 1 and max_concurrency
+    limiter = scheduler.AdaptiveLimiter(max_concurrency=max_concurrency)
+    scheduler.install(limiter)
 
-    FlowRegistry.discover_flows()
-    flow_path = FlowRegistry.get_flow_path(flow_id)
-    flow = Flow.from_yaml(flow_path)
+    cache = None
+    if llm_cache_dir:
+        from pipelines import llm_cache
+
+        cache = llm_cache.LLMResponseCache(llm_cache_dir)
+        llm_cache.install(cache)
+
+    base_df = artifacts.read_dataset(base_dataset.path)
+    df = base_df.iloc[shard["rows"]].reset_index(drop=True)
+
+    # The repo's flow (copied into the image next to pipelines/) unless a registry flow is named
+    if flow_id:
+        FlowRegistry.discover_flows()
+        flow_path = FlowRegistry.get_flow_path(flow_id)
+    else:
+        flow_path = Path(pipelines.__file__).resolve().parent.parent / flow_path
+    flow = Flow.from_yaml(str(flow_path))
     flow.set_model_config(model=model, api_base=api_base)
+    instrumentation.instrument_blocks(block_metrics, flow.blocks)
+
+    checkpoint_root = Path(checkpoint_dir) / run_id if checkpoint_dir else Path(tempfile.gettempdir())
+    checkpoint_path = checkpoint_root / f"shard-{shard['shard_id']}.jsonl"
+    row_ids = generate_checkpointed(
+        flow, df, checkpoint_path, batch_size=batch_size, prefix_ordered=prefix_ordered,
+        max_concurrency=limiter.max_concurrency,
+    )
+    print(f"LLM scheduler: {limiter.stats()}")
+    if cache is not None:
+        print(f"LLM cache: {cache.stats()}")
+    for line in block_metrics.format_table(label="block"):
+        print(line)
+    block_metrics.log_kfp(metrics)
+    for name, value in block_metrics.totals().items():
+        metrics.log_metric(f"total.{name}", round(float(value), 6))
+
+    write = write_parquet_from_checkpoint if artifact_format == "parquet" else write_json_from_checkpoint
+    count = write(checkpoint_path, prompts_dataset.path, row_ids=row_ids)
+    prompts_dataset.metadata["shard_id"] = shard["shard_id"]
+    prompts_dataset.metadata["format"] = artifact_format
+    print(f"Shard {shard['shard_id']}: generated {count} red-team prompts")
+
+
+@dsl.component(base_image=PIPELINE_IMAGE, packages_to_install=PACKAGES_TO_INSTALL)
+def merge_shards(
+        shards: Input[List[Dataset]],
+        prompts_dataset: Output[Dataset],
+        artifact_format: str = "parquet",
+):
+    """Concatenate shard outputs in shard order, independent of completion order."""
+    import json
 
-    result = flow.generate(df)
+    from pipelines import artifacts
 
-    pool_cols = [c for c in result.columns if c.endswith("_pool")]
-    output_df = result.drop(columns=pool_cols, errors="ignore")
+    ordered = sorted(shards, key=lambda a: a.metadata["shard_id"])
+    if artifact_format == "parquet":
+        count = artifacts.concat_parquet([a.path for a in ordered], prompts_dataset.path)
+    else:
+        records = []
+        for artifact in ordered:
+            with open(artifact.path) as f:
+                records.extend(json.load(f))
+        with open(prompts_dataset.path, "w") as f:
+            json.dump(records, f, indent=2)
+        count = len(records)
+    prompts_dataset.metadata["format"] = artifact_format
 
-    output_df.to_json(prompts_dataset.path, orient="records", indent=2)
-    print(f"Generated {len(output_df)} red-team prompts with {output_df.shape[1]} columns")
+    print(f"Merged {len(shards)} shards into {count} red-team prompts")
 
 
 @dsl.component(base_image=PIPELINE_IMAGE, packages_to_install=PACKAGES_TO_INSTALL)
@@ -179,28 +324,61 @@ def upload_to_s3(
         prompts_dataset: Input[Dataset],
         bucket: str,
         s3_key: str = "",
+        s3_prefix: str = "",
+        s3_endpoint_url: str = "",
         aws_access_key_id: str = "",
         aws_secret_access_key: str = "",
         aws_default_region: str = "us-east-1",
-):
+        content_addressed: bool = True,
+        compression: str = "auto",
+        part_size_mb: int = 16,
+        max_concurrency: int = 8,
+) -> NamedTuple("UploadOutputs", [("object_key", str), ("pointer_key", str)]):
+    """Upload the dataset once per distinct content (see pipelines/s3_upload.py).
+
+    With ``content_addressed`` the data is stored as
+    ``<s3_prefix>objects/<sha256>.<format>`` and ``s3_key`` names a JSON
+    pointer to it, not the dataset itself; ``<s3_prefix>latest.pointer.json``
+    is repointed too. Without it, ``s3_key`` is the data object. Either way
+    its extension is replaced by the artifact's format.
+
+    Outputs ``object_key`` (the data) and ``pointer_key`` (empty without
+    ``content_addressed``).
+    """
     import os
-    import boto3
+    from collections import namedtuple
     from datetime import datetime
+    from pathlib import PurePosixPath
+
+    import boto3
+
+    from pipelines import s3_upload
 
     os.environ["AWS_ACCESS_KEY_ID"] = aws_access_key_id
     os.environ["AWS_SECRET_ACCESS_KEY"] = aws_secret_access_key
     os.environ["AWS_DEFAULT_REGION"] = aws_default_region
 
-    key = s3_key or ("red_team_prompts_" + datetime.utcnow().strftime("%Y%m%dT%H%M%SZ") + ".json")
-
-    s3 = boto3.client("s3")
-    s3.upload_file(
+    name = (
+        str(PurePosixPath(s3_key).with_suffix("")) if s3_key
+        else "red_team_prompts_" + datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    )
+    s3 = boto3.client("s3", endpoint_url=s3_endpoint_url or None)
+    result = s3_upload.upload_dataset(
+        s3,
         prompts_dataset.path,
         bucket,
-        key,
-        ExtraArgs={"ContentType": "application/json"},
+        name,
+        prefix=s3_prefix,
+        compression=compression,
+        config=s3_upload.transfer_config(part_size_mb, max_concurrency),
+        content_addressed=content_addressed,
     )
-    print(f"Uploaded to s3://{bucket}/{key}")
+    action = "Uploaded" if result["uploaded"] else "Unchanged, reusing"
+    print(f"{action} s3://{bucket}/{result['object']} ({result['size']} bytes, {result['compression']})")
+    if result["pointer"]:
+        print(f"Pointer: s3://{bucket}/{result['pointer']}")
+    outputs = namedtuple("UploadOutputs", ["object_key", "pointer_key"])
+    return outputs(result["object"], result["pointer"] or "")
 
 
 # ── Pipeline ───────────────────────────────────────────────────────────────────
@@ -212,26 +390,60 @@ def upload_to_s3(
 def red_team_prompt_generation_pipeline(
         model: str = "hosted_vllm/ilyagusevgemma-2-9b-it-abliterated",
         api_base: str = "http://ilyagusevgemma-2-9b-it-abliterated-predictor.stuart-testing.svc.cluster.local:8080/v1",
-        flow_id: str = "major-sage-742",
+        flow_path: str = "data/flow.yaml",
+        flow_id: str = "",
+        rows_per_shard: int = 1,
+        llm_cache_dir: str = LLM_CACHE_MOUNT if LLM_CACHE_PVC else "",
+        max_concurrency: int = 64,
+        prefix_ordered: bool = False,
+        artifact_format: str = ARTIFACT_FORMAT,
         s3_bucket: str = "",
         s3_key: str = "",
+        s3_prefix: str = "",
+        s3_endpoint_url: str = "",
         aws_access_key_id: str = "",
         aws_secret_access_key: str = "",
         aws_default_region: str = "us-east-1",
 ):
-    create_task = create_base_dataset()
+    create_task = create_base_dataset(artifact_format=artifact_format)
 
-    generate_task = generate_red_team_prompts(
+    shard_task = plan_shards(
         base_dataset=create_task.outputs["dataset"],
-        model=model,
-        api_base=api_base,
-        flow_id=flow_id,
+        rows_per_shard=rows_per_shard,
+    )
+
+    with dsl.ParallelFor(items=shard_task.output, parallelism=MAX_PARALLEL_SHARDS) as shard:
+        generate_task = generate_red_team_prompts(
+            base_dataset=create_task.outputs["dataset"],
+            model=model,
+            api_base=api_base,
+            shard=shard,
+            flow_path=flow_path,
+            flow_id=flow_id,
+            llm_cache_dir=llm_cache_dir,
+            max_concurrency=max_concurrency,
+            prefix_ordered=prefix_ordered,
+            checkpoint_dir=CHECKPOINT_MOUNT if LLM_CACHE_PVC else "",
+            run_id=dsl.PIPELINE_JOB_ID_PLACEHOLDER,
+            artifact_format=artifact_format,
+        )
+        generate_task.set_retry(num_retries=SHARD_RETRIES, backoff_duration="30s")
+        if LLM_CACHE_PVC:
+            from kfp import kubernetes
+
+            kubernetes.mount_pvc(generate_task, pvc_name=LLM_CACHE_PVC, mount_path=LLM_CACHE_MOUNT)
+
+    merge_task = merge_shards(
+        shards=dsl.Collected(generate_task.outputs["prompts_dataset"]),
+        artifact_format=artifact_format,
     )
 
     upload_to_s3(
-        prompts_dataset=generate_task.outputs["prompts_dataset"],
+        prompts_dataset=merge_task.outputs["prompts_dataset"],
         bucket=s3_bucket,
         s3_key=s3_key,
+        s3_prefix=s3_prefix,
+        s3_endpoint_url=s3_endpoint_url,
         aws_access_key_id=aws_access_key_id,
         aws_secret_access_key=aws_secret_access_key,
         aws_default_region=aws_default_region,
@@ -272,9 +484,14 @@ if __name__ == "__main__":
                 "API_BASE",
                 "http://ilyagusevgemma-2-9b-it-abliterated-predictor.stuart-testing.svc.cluster.local:8080/v1",
             ),
-            "flow_id": os.environ.get("FLOW_ID", "major-sage-742"),
+            "flow_path": os.environ.get("FLOW_PATH", "data/flow.yaml"),
+            "flow_id": os.environ.get("FLOW_ID", ""),
+            "rows_per_shard": int(os.environ.get("ROWS_PER_SHARD", "1")),
+            "prefix_ordered": os.environ.get("PREFIX_ORDERED", "") not in ("", "0", "false"),
             "s3_bucket": os.environ["AWS_S3_BUCKET"],
             "s3_key": os.environ.get("AWS_S3_KEY", ""),
+            "s3_prefix": os.environ.get("AWS_S3_PREFIX", ""),
+            "s3_endpoint_url": os.environ.get("AWS_S3_ENDPOINT", ""),
             "aws_access_key_id": os.environ["AWS_ACCESS_KEY_ID"],
             "aws_secret_access_key": os.environ["AWS_SECRET_ACCESS_KEY"],
             "aws_default_region": os.environ.get("AWS_DEFAULT_REGION", "us-east-1"),
@@ -0,0 +1,173 @@
+"""Content-addressed, multipart S3 upload for dataset artifacts.
+
+Every pipeline run used to upload its dataset under a fresh timestamped key,
+as one stream, even when the content was identical to the last run.
+``upload_dataset`` instead:
+
+1. hashes the file (SHA-256) and stores the data once, under
+   ``<prefix>objects/<sha256>.<format>``. If that object already exists,
+   nothing is uploaded;
+2. otherwise uploads it with a ``TransferConfig``. Parts of ``part_size_mb``
+   go up ``max_concurrency`` at a time, and JSON can be gzip-compressed on
+   the fly. Parquet is already zstd-compressed and is sent as is;
+3. writes a small JSON pointer under the run's own name that records the
+   object key, hash, size and format, and repoints ``<prefix>latest.pointer.json``
+   at the same object.
+
+Pass any boto3 S3 client. ``endpoint_url`` on the client targets MinIO, and
+a client created under ``moto.mock_aws`` works for local testing.
+"""
+
+import hashlib
+import io
+import json
+import zlib
+from datetime import datetime, UTC
+from pathlib import Path
+
+from pipelines.artifacts import CONTENT_TYPES, dataset_format
+
+COMPRESSIONS = ("auto", "none", "gzip")
+LATEST_POINTER = "latest.pointer.json"
+_HASH_CHUNK = 1 << 20
+
+
+def content_hash(path, chunk_size=_HASH_CHUNK):
+    """SHA-256 hex digest of the file at ``path``, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class GzipStream(io.RawIOBase):
+    """Read-only stream of the gzip-compressed bytes of ``f``, produced as it is read."""
+
+    def __init__(self, f, chunk_size=_HASH_CHUNK, level=6):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        self._buffer = bytearray()
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while len(self._buffer) < len(b) and not self._eof:
+            chunk = self._f.read(self._chunk_size)
+            if chunk:
+                self._buffer += self._compressor.compress(chunk)
+            else:
+                self._buffer += self._compressor.flush()
+                self._eof = True
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        del self._buffer[:n]
+        return n
+
+
+def transfer_config(part_size_mb=16, max_concurrency=8):
+    """``TransferConfig`` that switches to multipart at one part and uses threads."""
+    from boto3.s3.transfer import TransferConfig
+
+    part_size = part_size_mb * 1024 * 1024
+    return TransferConfig(
+        multipart_threshold=part_size,
+        multipart_chunksize=part_size,
+        max_concurrency=max_concurrency,
+        use_threads=max_concurrency > 1,
+    )
+
+
+def _exists(s3, bucket, key):
+    from botocore.exceptions import ClientError
+
+    try:
+        s3.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+    return True
+
+
+def upload_dataset(s3, path, bucket, name, prefix="", compression="auto", config=None,
+                   content_addressed=True):
+    """Upload the dataset at ``path`` to ``bucket``, skipping content already there.
+
+    Parameters
+    ----------
+    s3 : botocore.client.S3
+        ``boto3.client("s3", ...)``.
+    path : Path | str
+        Parquet or JSON dataset (see ``pipelines.artifacts``).
+    name : str
+        Run-specific name, e.g. ``red_team_prompts_<timestamp>``. With
+        ``content_addressed`` it names the pointer; otherwise the data
+        itself goes to ``<prefix><name>``.
+    prefix : str
+        Key prefix, e.g. ``"red-team/"``.
+    compression : str
+        One of ``COMPRESSIONS``. ``auto`` gzips JSON and leaves Parquet alone.
+    config : TransferConfig, optional
+        From :func:`transfer_config`; boto3 defaults when omitted.
+
+    Returns
+    -------
+    dict
+        ``object`` (data key), ``pointer`` (pointer key or None), ``sha256``,
+        ``size``, ``format``, ``compression`` and ``uploaded`` (False when
+        the content was already in the bucket).
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"compression must be one of {COMPRESSIONS}, got {compression!r}")
+    path = Path(path)
+    fmt = dataset_format(path)
+    if compression == "auto":
+        compression = "gzip" if fmt == "json" else "none"
+    suffix = f".{fmt}" + (".gz" if compression == "gzip" else "")
+
+    digest = content_hash(path) if content_addressed else None
+    key = f"{prefix}objects/{digest}{suffix}" if content_addressed else f"{prefix}{name}{suffix}"
+    extra_args = {"ContentType": CONTENT_TYPES[fmt]}
+    if compression == "gzip":
+        extra_args["ContentEncoding"] = "gzip"
+    if digest:
+        extra_args["Metadata"] = {"sha256": digest}
+
+    uploaded = not (content_addressed and _exists(s3, bucket, key))
+    if uploaded:
+        with open(path, "rb") as f:
+            body = GzipStream(f) if compression == "gzip" else f
+            s3.upload_fileobj(body, bucket, key, ExtraArgs=extra_args, Config=config)
+
+    result = {
+        "object": key,
+        "pointer": None,
+        "sha256": digest,
+        "size": path.stat().st_size,
+        "format": fmt,
+        "compression": compression,
+        "uploaded": uploaded,
+    }
+    if content_addressed:
+        result["pointer"] = f"{prefix}{name}.pointer.json"
+        pointer = json.dumps({
+            "bucket": bucket,
+            "object": key,
+            "sha256": digest,
+            "size": result["size"],
+            "format": fmt,
+            "compression": compression,
+            "created": datetime.now(UTC).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }, indent=2).encode()
+        for pointer_key in (result["pointer"], f"{prefix}{LATEST_POINTER}"):
+            s3.put_object(Bucket=bucket, Key=pointer_key, Body=pointer, ContentType="application/json")
+    return result
+
+
+def resolve_pointer(s3, bucket, pointer_key):
+    """The pointer document at ``pointer_key``; its ``object`` is the data key."""
+    return json.loads(s3.get_object(Bucket=bucket, Key=pointer_key)["Body"].read())
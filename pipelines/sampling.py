@@ -0,0 +1,217 @@
+"""Vectorized, coverage-aware attribute sampling.
+
+Each input row (a policy concept) carries one pool per dimension: a list of
+values, or a ``{value: weight}`` dict. ``sample_attributes`` expands every row
+into several samples and assigns one value per dimension, in one of three modes:
+
+``independent``
+    i.i.d. weighted draws, same as RowMultiplierBlock followed by one
+    SamplerBlock per dimension.
+``stratified``
+    Every dimension's values are allotted in proportion to their weights
+    (largest remainder) and shuffled independently per dimension, so each
+    value appears as soon as there are enough rows for it.
+``pairwise``
+    Greedy covering array: rows are added until every value and every pair
+    of values across two dimensions occurs at least once, or ``num_samples``
+    is hit.
+    A few dozen rows cover what independent draws need many more for.
+
+Pools are padded into ``(concepts x values)`` probability matrices so the
+independent and stratified draws run as single NumPy operations over all rows.
+"""
+
+import itertools
+import math
+
+import numpy as np
+
+MODES = ("independent", "stratified", "pairwise")
+
+
+def parse_pool(pool):
+    """Return ``(values, weights)`` for a list, weighted dict or scalar pool.
+
+    Missing pools (None/NaN) give ``([], [])``.
+    """
+    if pool is None or (isinstance(pool, float) and math.isnan(pool)):
+        return [], []
+    if isinstance(pool, dict):
+        values = list(pool)
+        weights = [float(pool[v]) for v in values]
+    elif isinstance(pool, (list, tuple, np.ndarray)):
+        values = list(pool)
+        weights = [1.0] * len(values)
+    else:
+        values, weights = [pool], [1.0]
+    total = sum(weights)
+    if values and total <= 0:
+        raise ValueError(f"Pool weights must sum to a positive number: {pool!r}")
+    return values, [w / total for w in weights]
+
+
+class Dimension:
+    """One sampled dimension across all concepts, as padded matrices.
+
+    Attributes
+    ----------
+    values : np.ndarray
+        ``(concepts, width)`` object array of pool values, None-padded.
+    probs : np.ndarray
+        ``(concepts, width)`` float array of weights; padding has weight 0.
+    sizes : np.ndarray
+        Number of real values per concept (0 for a missing pool).
+    """
+
+    def __init__(self, pools):
+        parsed = [parse_pool(p) for p in pools]
+        self.sizes = np.array([len(v) for v, _ in parsed], dtype=np.int64)
+        width = max(1, int(self.sizes.max(initial=0)))
+        self.values = np.full((len(parsed), width), None, dtype=object)
+        self.probs = np.zeros((len(parsed), width))
+        for c, (values, weights) in enumerate(parsed):
+            self.values[c, :len(values)] = values
+            self.probs[c, :len(weights)] = weights
+        # Missing pools draw the placeholder slot 0, which lookup() maps to None
+        self.probs[self.sizes == 0, 0] = 1.0
+
+    def lookup(self, concept_of_row, idx):
+        """Map per-row value indices back to values (None where the pool is missing)."""
+        out = self.values[concept_of_row, np.clip(idx, 0, None)]
+        out[self.sizes[concept_of_row] == 0] = None
+        return out
+
+
+def draw_independent(dim, concept_of_row, rng):
+    """Inverse-CDF weighted draw for every row at once."""
+    cdf = np.cumsum(dim.probs, axis=1)[concept_of_row]
+    u = rng.random(len(concept_of_row))[:, None]
+    idx = (u >= cdf).sum(axis=1)
+    return np.minimum(idx, np.maximum(dim.sizes[concept_of_row] - 1, 0))
+
+
+def draw_stratified(dim, counts, concept_of_row, rng):
+    """Proportional allocation per concept, shuffled within each concept."""
+    quotas = dim.probs * counts[:, None]
+    alloc = np.floor(quotas).astype(np.int64)
+    remainder = counts - alloc.sum(axis=1)
+    # Hand the leftover rows to the largest fractional quotas
+    order = np.argsort(-(quotas - alloc), axis=1, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(order.shape[1])[None, :], axis=1)
+    alloc += (ranks < remainder[:, None]) & (dim.probs > 0)
+
+    width = alloc.shape[1]
+    idx = np.repeat(np.tile(np.arange(width), len(counts)), alloc.ravel())
+    shuffle = np.lexsort((rng.random(len(idx)), concept_of_row))
+    return idx[shuffle]
+
+
+def covering_rows(dims, concept, max_rows, rng, candidates=64):
+    """Greedy pairwise covering array for one concept (AETG-style).
+
+    Each step seeds ``candidates`` random rows with one still-uncovered pair
+    and keeps the row that covers the most uncovered pairs. A concept with
+    nothing to cover (no pool holds more than one value) still gets one row.
+
+    Returns
+    -------
+    np.ndarray
+        ``(rows, len(dims))`` value indices.
+    """
+    active = [d for d, dim in enumerate(dims) if dim.sizes[concept] > 1]
+    # (a, a) entries are the diagonal, i.e. every single value must appear too
+    uncovered = {
+        (a, b): np.outer(dims[a].probs[concept] > 0, dims[b].probs[concept] > 0)
+        if a != b else np.diag(dims[a].probs[concept] > 0)
+        for a, b in itertools.combinations_with_replacement(active, 2)
+    }
+    probs = [dim.probs[concept] for dim in dims]
+    rows = []
+    while max_rows is None or len(rows) < max_rows:
+        remaining = [(pair, np.argwhere(mask)) for pair, mask in uncovered.items() if mask.any()]
+        # Always emit one row, so a concept with only single-valued pools is kept
+        if not remaining and rows:
+            break
+        cand = np.stack([
+            rng.choice(len(p), size=candidates, p=p) if p.sum() else np.zeros(candidates, int)
+            for p in probs
+        ], axis=1)
+        if remaining:
+            # Seed every candidate with one uncovered pair so each step makes progress
+            (a, b), cells = remaining[rng.integers(len(remaining))]
+            va, vb = cells[rng.integers(len(cells))]
+            cand[:, a], cand[:, b] = va, vb
+        score = np.zeros(candidates, dtype=np.int64)
+        for (a, b), mask in uncovered.items():
+            score += mask[cand[:, a], cand[:, b]]
+        best = cand[int(np.argmax(score))]
+        for (a, b), mask in uncovered.items():
+            mask[best[a], best[b]] = False
+        rows.append(best)
+    if not rows:
+        return np.zeros((0, len(dims)), dtype=np.int64)
+    return np.array(rows, dtype=np.int64)
+
+
+def sample_attributes(pools_by_dim, num_samples=30, mode="stratified", seed=None, candidates=64):
+    """Sample one value per dimension for every expanded row.
+
+    Parameters
+    ----------
+    pools_by_dim : list[Sequence]
+        One sequence of per-concept pools per dimension.
+    num_samples : int, optional
+        Rows per concept. In ``pairwise`` mode an upper bound; None means
+        "until all pairs are covered".
+    mode : str
+        One of ``MODES``.
+    seed : int, optional
+        Makes the draw reproducible.
+    candidates : int
+        Candidate rows scored per greedy step in ``pairwise`` mode.
+
+    Returns
+    -------
+    tuple[np.ndarray, list[np.ndarray]]
+        The source concept index of every output row, and one value array
+        per dimension aligned with it.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+    if num_samples is None and mode != "pairwise":
+        raise ValueError(f"num_samples is required in {mode} mode")
+
+    rng = np.random.default_rng(seed)
+    dims = [Dimension(pools) for pools in pools_by_dim]
+    n_concepts = len(pools_by_dim[0]) if pools_by_dim else 0
+
+    if mode == "pairwise":
+        blocks = [covering_rows(dims, c, num_samples, rng, candidates) for c in range(n_concepts)]
+        counts = np.array([len(b) for b in blocks], dtype=np.int64)
+        concept_of_row = np.repeat(np.arange(n_concepts), counts)
+        stacked = np.concatenate(blocks) if blocks else np.zeros((0, len(dims)), dtype=np.int64)
+        idx_by_dim = [stacked[:, d] for d in range(len(dims))]
+    else:
+        counts = np.full(n_concepts, num_samples, dtype=np.int64)
+        concept_of_row = np.repeat(np.arange(n_concepts), counts)
+        if mode == "independent":
+            idx_by_dim = [draw_independent(dim, concept_of_row, rng) for dim in dims]
+        else:
+            idx_by_dim = [draw_stratified(dim, counts, concept_of_row, rng) for dim in dims]
+
+    return concept_of_row, [dim.lookup(concept_of_row, idx) for dim, idx in zip(dims, idx_by_dim)]
+
+
+def pair_coverage(pools, columns):
+    """Fraction of possible cross-dimension value pairs present in ``columns``.
+
+    ``pools`` holds one concept's pool per dimension and ``columns`` the
+    sampled values per dimension for that concept's rows.
+    """
+    seen = possible = 0
+    for (pool_a, a), (pool_b, b) in itertools.combinations(zip(pools, columns), 2):
+        values_a, values_b = parse_pool(pool_a)[0], parse_pool(pool_b)[0]
+        possible += len(values_a) * len(values_b)
+        seen += len({(x, y) for x, y in zip(a, b) if x is not None and y is not None})
+    return seen / possible if possible else 1.0
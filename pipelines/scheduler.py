@@ -0,0 +1,275 @@
+"""Adaptive concurrency for the flow's LLM requests.
+
+A fixed ``max_concurrency`` is either too low for a scaled-out vLLM predictor
+or overloads a single replica. ``AdaptiveLimiter`` starts small and grows the
+number of in-flight requests by one per healthy window (additive increase)
+while latency stays close to the best observed baseline and few requests
+fail, and cuts it by ``decrease_factor`` on throttling (429/503) or timeouts
+(multiplicative decrease). A window that is slow or has too many other
+errors (e.g. 500s) shrinks the limit by one instead of growing it.
+Throttled and timed-out requests are retried with full-jitter exponential
+backoff.
+
+Usage::
+
+    from pipelines import scheduler
+
+    limiter = scheduler.AdaptiveLimiter(max_concurrency=64)
+    scheduler.install(limiter)
+    result = flow.generate(df, max_concurrency=limiter.max_concurrency)
+    print(limiter.stats())
+
+``tools/fake_openai_server.py`` serves an OpenAI-compatible endpoint with
+injected latency and throttling to exercise this locally.
+"""
+
+import asyncio
+import random
+import statistics
+import threading
+import time
+
+from pipelines import _litellm
+
+# HTTP statuses that mean "slow down" rather than "your request is wrong"
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+
+def is_retryable(exc):
+    """True for throttling, overload and timeout errors."""
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError)):
+        return True
+    if getattr(exc, "status_code", None) in RETRY_STATUSES:
+        return True
+    return "Timeout" in type(exc).__name__
+
+
+def _retry_after(exc):
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limiter with latency and error feedback.
+
+    Parameters
+    ----------
+    initial_concurrency : int
+        Concurrency to start probing from.
+    min_concurrency, max_concurrency : int
+        Bounds for the adaptive limit.
+    latency_tolerance : float
+        Grow only while the window's median latency is within this fraction
+        of the best median seen so far (0.5 = up to 50% slower).
+    error_tolerance : float
+        Grow only while at most this fraction of the window's requests
+        failed with non-retryable errors.
+    decrease_factor : float
+        Multiplier applied to the limit on throttling or timeouts.
+    max_retries : int
+        Retries per request for retryable errors.
+    backoff_base, backoff_cap : float
+        Full-jitter backoff: sleep ``uniform(0, min(cap, base * 2**attempt))``
+        seconds, or the server's ``Retry-After`` when it is larger.
+    """
+
+    def __init__(self, initial_concurrency=4, min_concurrency=1, max_concurrency=64,
+                 latency_tolerance=0.5, error_tolerance=0.05, decrease_factor=0.75, max_retries=6,
+                 backoff_base=0.5, backoff_cap=30.0):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.limit = max(min_concurrency, min(initial_concurrency, max_concurrency))
+        self.latency_tolerance = latency_tolerance
+        self.error_tolerance = error_tolerance
+        self.decrease_factor = decrease_factor
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.retries = 0
+        self.peak_concurrency = self.limit
+        self._latencies = []
+        self._window = []
+        self._window_errors = 0
+        self._window_throttled = False
+        self._baseline = None
+        self._started = None
+        self._lock = threading.Lock()
+        self._loop = None
+        self._cond = None
+
+    # ── feedback ─────────────────────────────────────────────────────────────
+
+    def record_success(self, latency):
+        with self._lock:
+            self.requests += 1
+            self._latencies.append(latency)
+            self._window.append(latency)
+            if len(self._window) + self._window_errors >= self.limit:
+                self._end_window()
+
+    def record_throttle(self):
+        with self._lock:
+            self.throttled += 1
+            if not self._window_throttled:
+                # One decrease per window: a burst of 429s is one congestion signal
+                self._window_throttled = True
+                self.limit = max(self.min_concurrency, int(self.limit * self.decrease_factor))
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+            self._window_errors += 1
+            if len(self._window) + self._window_errors >= self.limit:
+                self._end_window()
+
+    def _end_window(self):
+        healthy = self._window_errors <= self.error_tolerance * (len(self._window) + self._window_errors)
+        if self._window:
+            median = statistics.median(self._window)
+            if self._baseline is None or median < self._baseline:
+                self._baseline = median
+            healthy = healthy and median <= self._baseline * (1 + self.latency_tolerance)
+        if not self._window_throttled and healthy and self.limit < self.max_concurrency:
+            self.limit += 1
+            self.peak_concurrency = max(self.peak_concurrency, self.limit)
+        elif not healthy:
+            self.limit = max(self.min_concurrency, self.limit - 1)
+        self._window = []
+        self._window_errors = 0
+        self._window_throttled = False
+
+    def backoff(self, attempt, exc=None):
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        hint = _retry_after(exc) if exc is not None else None
+        return max(delay, hint or 0.0)
+
+    # ── slots ────────────────────────────────────────────────────────────────
+
+    def _condition(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # flow.generate may spin up a fresh event loop per call
+            self._loop = loop
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def acquire(self):
+        cond = self._condition()
+        async with cond:
+            await cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        if self._started is None:
+            self._started = time.monotonic()
+
+    async def release(self):
+        cond = self._condition()
+        async with cond:
+            self.in_flight -= 1
+            cond.notify_all()
+
+    def stats(self):
+        """Current limit and achieved throughput/latency."""
+        with self._lock:
+            elapsed = time.monotonic() - self._started if self._started else 0.0
+            latencies = sorted(self._latencies)
+        return {
+            "concurrency": self.limit,
+            "peak_concurrency": self.peak_concurrency,
+            "requests": self.requests,
+            "requests_per_sec": self.requests / elapsed if elapsed else 0.0,
+            "p50_latency_s": latencies[len(latencies) // 2] if latencies else None,
+            "p99_latency_s": latencies[int(len(latencies) * 0.99)] if latencies else None,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "errors": self.errors,
+        }
+
+    # ── request execution ────────────────────────────────────────────────────
+
+    async def run(self, call):
+        """Run ``await call()`` within the limit, retrying retryable failures."""
+        for attempt in range(self.max_retries + 1):
+            await self.acquire()
+            start = time.monotonic()
+            try:
+                result = await call()
+            except Exception as exc:
+                retryable = is_retryable(exc)
+                if retryable:
+                    self.record_throttle()
+                else:
+                    self.record_error()
+                if not retryable or attempt == self.max_retries:
+                    raise
+                error = exc
+            else:
+                self.record_success(time.monotonic() - start)
+                return result
+            finally:
+                await self.release()
+            self.retries += 1
+            await asyncio.sleep(self.backoff(attempt, error))
+
+    def run_sync(self, call):
+        """Blocking counterpart of :meth:`run` for synchronous completions.
+
+        Synchronous calls are already serial, so only retry/backoff and the
+        statistics apply.
+        """
+        if self._started is None:
+            self._started = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            start = time.monotonic()
+            try:
+                result = call()
+            except Exception as exc:
+                retryable = is_retryable(exc)
+                if retryable:
+                    self.record_throttle()
+                else:
+                    self.record_error()
+                if not retryable or attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                time.sleep(self.backoff(attempt, exc))
+            else:
+                self.record_success(time.monotonic() - start)
+                return result
+
+
+def install(limiter):
+    """Route litellm completions through ``limiter``. Returns an undo function.
+
+    Install before :func:`pipelines.llm_cache.install` so cache hits do not
+    take a concurrency slot.
+    """
+
+    def wrap_sync(original):
+        def completion(*args, **kwargs):
+            return limiter.run_sync(lambda: original(*args, **kwargs))
+
+        return completion
+
+    def wrap_async(original):
+        async def acompletion(*args, **kwargs):
+            return await limiter.run(lambda: original(*args, **kwargs))
+
+        return acompletion
+
+    undo_sync = _litellm.patch("completion", wrap_sync)
+    undo_async = _litellm.patch("acompletion", wrap_async)
+
+    def undo():
+        undo_sync()
+        undo_async()
+
+    return undo
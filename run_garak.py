@@ -9,21 +9,109 @@ Third step in the demo flow:
                                        $XDG_DATA_HOME/garak/data/cas/
   3. run_garak.py (this script)      — runs garak with data/garak.yaml and
                                        prints the resulting report paths
+
+Usage:
+  python run_garak.py                                # one garak process
+  python run_garak.py --shard-by probe --workers 6   # one process per probe
+  python run_garak.py --shard-by both --workers 16   # one per intent x probe
+  python run_garak.py --adaptive --workers 16        # rounds per intent x probe, early stopping
+  python run_garak.py --worker --intents S001,S004   # run in a warm tools.garak_worker
+
+Sharded runs write per-shard configs, logs and reports under
+garak_runs/shards/<uuid>/ and merge them into garak_runs/garak.<uuid>.report.jsonl.
+
+--adaptive runs every intent x probe cell in rounds of --round-generations
+and stops a cell once the confidence interval on its judge-scored compliance
+rate is clearly above or below run.eval_threshold (tools/garak_adaptive.py).
+Generations freed by stopped cells go to the uncertain ones; the run never
+spends more generations than the fixed run would. The decisions are printed and recorded as early_stopping entries in the merged report.
+
+--worker sends the run to a long-lived worker (python -m tools.garak_worker)
+that already has garak imported, the translator models loaded and HTTP
+connections to the endpoints open, and streams its output back. --intents
+restricts any run to a subset of the typology's intents.
+
+Judge verdicts (tools/judge_cache.py) are cached across runs unless
+--no-judge-cache is given; --judge-batch N sends the uncached judge requests of
+each attempt N at a time. --translation-cache also memoizes LocalHFTranslator
+translations across runs (tools/translation_cache.py), translating uncached
+text --translation-batch chunks per forward pass.
+
+Per-probe wall time, request, retry and token counts (tools/garak_metrics.py)
+are printed and written beside the report as garak.<uuid>.metrics.json;
+--metrics-textfile also writes them for the Prometheus node-exporter textfile
+collector.
 """
 
+import argparse
 import json
 import os
+import sys
+import uuid
 from pathlib import Path
 
+import yaml
 from llama_stack_provider_trustyai_garak.utils import _ensure_xdg_vars
 
+from pipelines.instrumentation import StageMetrics
+from tools import garak_metrics, garak_runner
+from tools.garak_adaptive import format_decisions, run_adaptive
+from tools.garak_shards import SHARD_BY, report_config, restrict_intents, run_sharded
+
 # ---------------------------------------------------------------------------
 # Setup
 # ---------------------------------------------------------------------------
 
+parser = argparse.ArgumentParser(description="Run the garak red-team evaluation.")
+parser.add_argument("--shard-by", choices=SHARD_BY, default=os.environ.get("GARAK_SHARD_BY", "none"),
+                    help="Split the run into parallel garak processes by probe, intent or both")
+parser.add_argument("--workers", type=int, default=int(os.environ.get("GARAK_WORKERS", "4")),
+                    help="Shards run at the same time")
+parser.add_argument("--intents", type=lambda s: [i.strip() for i in s.split(",") if i.strip()],
+                    help="Comma-separated intent ids to run (default: every intent in the typology)")
+parser.add_argument("--worker", action="store_true", default=os.environ.get("GARAK_WORKER") == "1",
+                    help="Run in the warm worker started with python -m tools.garak_worker")
+parser.add_argument("--worker-socket", type=Path, help="Worker socket (default: see tools/garak_worker.py)")
+parser.add_argument("--adaptive", action="store_true",
+                    help="Probe intent x probe cells in rounds and stop each once its outcome is clear")
+parser.add_argument("--max-rounds", type=int, default=5, help="Adaptive mode: rounds at most")
+parser.add_argument("--round-generations", type=int, default=1,
+                    help="Adaptive mode: run.generations per cell in the first round; later rounds share "
+                         "what is left of the fixed run's generations between the open cells")
+parser.add_argument("--confidence", type=float, default=0.95,
+                    help="Adaptive mode: confidence of the stopping decisions")
+parser.add_argument("--decision-rate", type=float,
+                    help="Adaptive mode: compliance rate to decide against (default: run.eval_threshold)")
+parser.add_argument("--min-outputs", type=int, default=10,
+                    help="Adaptive mode: scored outputs a cell needs before it can stop")
+parser.add_argument("--no-judge-cache", action="store_true",
+                    help="Call the judge for every (question, response) pair")
+parser.add_argument("--judge-batch", type=int, default=int(os.environ.get("JUDGE_CACHE_BATCH", "0")),
+                    help="Concurrent uncached judge requests per attempt (0 = sequential)")
+parser.add_argument("--translation-cache", action="store_true",
+                    default=os.environ.get("GARAK_TRANSLATION_CACHE") == "1",
+                    help="Memoize LocalHFTranslator translations across runs and batch the misses")
+parser.add_argument("--translation-batch", type=int,
+                    default=int(os.environ.get("TRANSLATION_CACHE_BATCH", "16")),
+                    help="Uncached texts per MarianMT forward pass (0 = one at a time)")
+parser.add_argument("--metrics-json", type=Path,
+                    help="Per-probe metrics JSON (default: <report>.metrics.json beside the report)")
+parser.add_argument("--metrics-textfile", type=Path, default=os.environ.get("GARAK_METRICS_TEXTFILE"),
+                    help="Also write per-probe metrics in Prometheus text format (e.g. garak.prom)")
+args = parser.parse_args()
+if args.worker and (args.adaptive or args.shard_by != "none"):
+    parser.error("--worker runs a single garak process; drop --shard-by/--adaptive")
+
+# Read by tools.garak_runner, in this process and in every shard process
+os.environ["GARAK_JUDGE_CACHE"] = "0" if args.no_judge_cache else "1"
+os.environ["JUDGE_CACHE_BATCH"] = str(args.judge_batch)
+os.environ["GARAK_TRANSLATION_CACHE"] = "1" if args.translation_cache else "0"
+os.environ["TRANSLATION_CACHE_BATCH"] = str(args.translation_batch)
+
 _ensure_xdg_vars()
 
-if "OPENAICOMPATIBLE_API_KEY" not in os.environ:
+# In worker mode the key must be set in the worker's environment instead
+if not args.worker and "OPENAICOMPATIBLE_API_KEY" not in os.environ:
     raise EnvironmentError(
         "Set OPENAICOMPATIBLE_API_KEY before running. "
         "Export it in your shell: export OPENAICOMPATIBLE_API_KEY=..."
@@ -49,23 +137,104 @@ with open(typology_path) as f:
 print(f"Typology: {typology_path}")
 print(f"Intents:  {list(typology.keys())}")
 
+intents = list(typology.keys())
+if args.intents:
+    unknown = sorted(set(args.intents) - set(intents))
+    if unknown:
+        sys.exit(f"Unknown intents: {unknown}")
+    intents = args.intents
+    print(f"Running:  {intents}")
+
 # ---------------------------------------------------------------------------
 # Run Garak
 # ---------------------------------------------------------------------------
 
-import garak.cli
+garak_runs = Path(xdg_data) / "garak" / "garak_runs"
 
-garak.cli.main(["--config", str(config_path)])
+if args.intents and not args.worker:
+    # The worker applies the subset itself
+    (garak_runs / "configs").mkdir(parents=True, exist_ok=True)
+    subset_config = restrict_intents(yaml.safe_load(config_path.read_text()), intents)
+    config_path = garak_runs / "configs" / f"garak.{uuid.uuid4()}.yaml"
+    config_path.write_text(yaml.safe_dump(subset_config, sort_keys=False))
+
+sharded = args.adaptive or args.shard_by != "none"
+if args.worker:
+    from tools import garak_worker
+
+    try:
+        worker_result = garak_worker.call(
+            "run", args.worker_socket, config=str(config_path), intents=args.intents,
+            env={k: os.environ[k] for k in garak_worker.FORWARDED_ENV},
+        )
+    except garak_worker.WorkerError as e:
+        sys.exit(f"Worker run failed: {e}")
+    cache_stats = worker_result["stats"]
+    probe_metrics = StageMetrics.merge([worker_result["metrics"]])
+elif sharded:
+    if args.adaptive:
+        merged_report, shard_results, decisions = run_adaptive(
+            config_path, intents, garak_runs, args.workers,
+            round_generations=args.round_generations, max_rounds=args.max_rounds,
+            confidence=args.confidence, decision_rate=args.decision_rate, min_outputs=args.min_outputs,
+        )
+    else:
+        merged_report, shard_results = run_sharded(
+            config_path, intents, garak_runs, args.shard_by, args.workers
+        )
+    failed = [r for r in shard_results if r["returncode"] != 0]
+    for r in failed:
+        print(f"Shard failed ({r['shard']['probe_spec']} / {r['shard']['intent_spec']}): see {r['log']}")
+    cache_stats = garak_runner.merge_stats([r["stats"] for r in shard_results])
+    probe_metrics = StageMetrics.merge([r["metrics"] for r in shard_results])
+else:
+    # A prefix of our own, so this run's report (and metrics) can be found by name
+    prefix = f"garak.{uuid.uuid4()}"
+    (garak_runs / "configs").mkdir(parents=True, exist_ok=True)
+    run_config_path = garak_runs / "configs" / f"{prefix}.yaml"
+    run_config = report_config(yaml.safe_load(config_path.read_text()), garak_runs, prefix)
+    run_config_path.write_text(yaml.safe_dump(run_config, sort_keys=False))
+    run_report_path = garak_runs / f"{prefix}.report.jsonl"
+    run_metrics_path = garak_runs / f"{prefix}.metrics.json"
+    cache_stats = garak_runner.run(run_config_path, metrics_path=run_metrics_path)
+    probe_metrics = StageMetrics.merge([json.loads(run_metrics_path.read_text())])
 
 # ---------------------------------------------------------------------------
 # Results
 # ---------------------------------------------------------------------------
 
-garak_runs = Path(xdg_data) / "garak" / "garak_runs"
-report_files = sorted(garak_runs.glob("*.report.jsonl"))
-html_files = sorted(garak_runs.glob("*.report.html"))
-
-if report_files:
-    print(f"JSONL report: {report_files[-1].resolve()}")
-if html_files:
-    print(f"HTML report:  {html_files[-1].resolve()}")
+if args.worker:
+    report_path = Path(worker_result["report"])
+    print(f"JSONL report: {report_path.resolve()}")
+    if worker_result["html"]:
+        print(f"HTML report:  {worker_result['html']}")
+    print(f"Worker run:   {worker_result['seconds']:.1f}s")
+elif not sharded:
+    report_path = run_report_path
+    html_path = report_path.with_name(report_path.name.replace(".jsonl", ".html"))
+    print(f"JSONL report: {report_path.resolve()}")
+    if html_path.exists():
+        print(f"HTML report:  {html_path.resolve()}")
+else:
+    report_path = merged_report
+    print(f"JSONL report: {merged_report.resolve()}")
+
+if args.adaptive:
+    for line in format_decisions(decisions):
+        print(line)
+
+for line in garak_runner.format_stats(cache_stats):
+    print(line)
+
+for line in probe_metrics.format_table(label="probe"):
+    print(line)
+metrics_json = args.metrics_json or report_path.with_name(
+    report_path.name.replace(".report.jsonl", ".metrics.json")
+)
+probe_metrics.write_json(metrics_json)
+print(f"Probe metrics: {metrics_json.resolve()}")
+if args.metrics_textfile:
+    probe_metrics.write_prometheus(args.metrics_textfile, garak_metrics.PROM_NAMESPACE, garak_metrics.PROM_LABEL)
+    print(f"Prometheus textfile: {args.metrics_textfile.resolve()}")
+if sharded and failed:
+    sys.exit(1)
@@ -0,0 +1,84 @@
+from pathlib import Path
+
+import pytest
+import yaml
+
+from tools import garak_adaptive
+from tools.garak_adaptive import allocate, critical_value, decide, format_decisions, wilson_interval
+
+Z = critical_value(0.95, 5)
+
+
+def cell(complied, scored):
+    return {"complied": complied, "scored": scored, "ci_low": 0.0, "ci_high": 1.0}
+
+
+def test_wilson_interval_narrows_around_rate():
+    assert wilson_interval(0, 0, Z) == (0.0, 1.0)
+    low_10, high_10 = wilson_interval(5, 10, Z)
+    low_100, high_100 = wilson_interval(50, 100, Z)
+    assert low_10 < low_100 < 0.5 < high_100 < high_10
+
+
+@pytest.mark.parametrize("complied, scored, expected", [
+    (19, 20, "above"),
+    (1, 20, "below"),
+    (10, 20, "undecided"),
+    (0, 0, "undecided"),
+    (3, 3, "undecided"),  # all complied, but too few outputs to rule out 0.5
+])
+def test_decide(complied, scored, expected):
+    c = cell(complied, scored)
+    assert decide(c, Z, 0.5) == expected
+    assert 0.0 <= c["ci_low"] <= c["ci_high"] <= 1.0
+
+
+def test_allocate_weights_by_width_within_budget():
+    cells = {"wide": cell(10, 20), "mid": cell(30, 60), "narrow": cell(100, 200)}
+    for c in cells.values():
+        decide(c, Z, 0.5)
+
+    allocation = allocate(cells, round_budget=12, base_generations=2)
+
+    assert sum(allocation.values()) <= 12
+    assert set(allocation) == set(cells)
+    assert allocation["wide"] >= allocation["mid"] >= allocation["narrow"] >= 1
+    assert max(allocation.values()) <= garak_adaptive._MAX_BOOST * 2
+
+
+def test_allocate_serves_widest_first_when_budget_is_short():
+    cells = {"wide": cell(1, 2), "mid": cell(10, 20), "narrow": cell(100, 200)}
+    for c in cells.values():
+        decide(c, Z, 0.5)
+
+    assert allocate(cells, round_budget=2, base_generations=1) == {"wide": 1, "mid": 1}
+
+
+def test_run_adaptive_stays_within_fixed_run_budget(tmp_path, monkeypatch):
+    config_path = tmp_path / "garak.yaml"
+    config_path.write_text(yaml.safe_dump({
+        "run": {"generations": 2, "eval_threshold": 0.5},
+        "plugins": {"probe_spec": "spo.SPOIntent,tap.TAPIntent,multilingual.TranslationIntent"},
+    }))
+    rounds = []
+
+    def run_shards(config, shards, work_dir, workers):
+        rounds.append(sum(s["generations"] for s in shards))
+        return [{"shard": s, "returncode": 0, "report": Path(work_dir) / "r.report.jsonl"} for s in shards]
+
+    # Half the outputs comply, so no cell can be decided and every round is spent
+    monkeypatch.setattr(garak_adaptive, "run_shards", run_shards)
+    monkeypatch.setattr(garak_adaptive, "output_counts", lambda report, threshold: (1, 2))
+    monkeypatch.setattr(garak_adaptive, "merge_reports", lambda *args, **kwargs: 0)
+    monkeypatch.setattr(garak_adaptive, "merge_hitlogs", lambda *args: None)
+
+    _, _, summary = garak_adaptive.run_adaptive(
+        config_path, ["S001", "S002"], tmp_path, round_generations=1, max_rounds=5
+    )
+
+    budget = 2 * 6
+    assert rounds[0] == 6
+    assert sum(rounds) <= budget
+    assert sum(c["generations"] for c in summary) == sum(rounds)
+    assert all(c["decision"] == "undecided" for c in summary)
+    assert format_decisions(summary)[-1] == f"Generations: {sum(rounds)} of {budget} for a fixed run (100%)"
@@ -0,0 +1,116 @@
+import sys
+import types
+
+import pytest
+
+from pipelines import llm_cache
+from pipelines.llm_cache import CacheMiss, LLMResponseCache
+
+MESSAGES = [{"role": "user", "content": "Write one prompt."}]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = LLMResponseCache(tmp_path)
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def fake_litellm(monkeypatch):
+    """A stand-in ``litellm`` module that records the calls reaching the model."""
+    module = types.ModuleType("litellm")
+    module.calls = []
+
+    def completion(*args, **kwargs):
+        module.calls.append(kwargs)
+        return {"choices": [{"message": {"content": "live"}}]}
+
+    module.completion = completion
+    module.acompletion = completion
+    module.ModelResponse = lambda **data: data
+    monkeypatch.setitem(sys.modules, "litellm", module)
+    return module
+
+
+def test_key_ignores_dict_ordering():
+    schema = {"type": "object", "properties": {"prompt": {"type": "string"}, "score": {"type": "number"}}}
+    reordered = {"properties": {"score": {"type": "number"}, "prompt": {"type": "string"}}, "type": "object"}
+    a = {"model": "m", "messages": MESSAGES, "response_format": schema, "temperature": 0.7}
+    b = {"temperature": 0.7, "response_format": reordered, "messages": MESSAGES, "model": "m"}
+    assert LLMResponseCache.key(a) == LLMResponseCache.key(b)
+
+
+def test_key_ignores_credentials_and_tracks_sampling():
+    base = {"model": "m", "messages": MESSAGES, "temperature": 0.7}
+    assert LLMResponseCache.key(base) == LLMResponseCache.key({**base, "api_key": "x", "timeout": 30})
+    assert LLMResponseCache.key(base) != LLMResponseCache.key({**base, "temperature": 0.8})
+
+
+def test_replay_only_raises_on_miss(tmp_path, fake_litellm):
+    cache = LLMResponseCache(tmp_path, replay_only=True)
+    undo = llm_cache.install(cache)
+    try:
+        with pytest.raises(CacheMiss):
+            fake_litellm.completion(model="m", messages=MESSAGES)
+        assert fake_litellm.calls == []
+
+        cache.put(cache.key({"model": "m", "messages": MESSAGES}), {"choices": ["cached"]})
+        assert fake_litellm.completion(model="m", messages=MESSAGES) == {"choices": ["cached"]}
+        assert fake_litellm.calls == []
+    finally:
+        undo()
+        cache.close()
+
+
+def test_miss_calls_model_and_stores(cache, fake_litellm):
+    undo = llm_cache.install(cache)
+    try:
+        first = fake_litellm.completion(model="m", messages=MESSAGES)
+        second = fake_litellm.completion(model="m", messages=MESSAGES)
+    finally:
+        undo()
+    assert first == second
+    assert len(fake_litellm.calls) == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_age_eviction(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    cache = LLMResponseCache(tmp_path, max_age_seconds=60)
+    cache.put("old", {"v": 1})
+    now[0] += 30
+    cache.put("new", {"v": 2})
+    now[0] += 45
+    assert cache.get("old") is None
+    assert cache.get("new") == {"v": 2}
+    cache.close()
+
+
+def test_size_eviction_drops_least_recently_used(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    cache = LLMResponseCache(tmp_path)
+    for key in ("a", "b", "c"):
+        now[0] += 1
+        cache.put(key, {"v": key})
+    now[0] += 1
+    cache.get("a")
+    size = cache.stats()["bytes"] // 3
+    cache.max_bytes = 2 * size
+    cache.evict()
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": "a"}
+    assert cache.get("c") == {"v": "c"}
+    cache.close()
+
+
+def test_eviction_runs_on_writes(tmp_path):
+    cache = LLMResponseCache(tmp_path, max_bytes=1)
+    for i in range(llm_cache._EVICT_EVERY - 1):
+        cache.put(f"k{i}", {"v": i})
+    assert cache.stats()["entries"] == llm_cache._EVICT_EVERY - 1
+    cache.put("last", {"v": "last"})
+    assert cache.stats()["entries"] == 0
+    cache.close()
@@ -0,0 +1,110 @@
+import gzip
+import json
+import os
+
+import boto3
+import pytest
+
+from pipelines import s3_upload
+from pipelines.artifacts import write_parquet
+
+mock_aws = pytest.importorskip("moto").mock_aws
+
+BUCKET = "datasets"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        monkeypatch.setenv(name, "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = tmp_path / "prompts"
+    path.write_text(json.dumps([{"policy_concept": "Fraud", "prompt": f"prompt {i}"} for i in range(100)]))
+    return path
+
+
+def object_keys(s3, prefix):
+    return [o["Key"] for o in s3.list_objects_v2(Bucket=BUCKET, Prefix=prefix).get("Contents", [])]
+
+
+def test_json_is_gzipped_and_round_trips(s3, dataset):
+    result = s3_upload.upload_dataset(s3, dataset, BUCKET, "run1", prefix="red-team/")
+
+    assert result["uploaded"]
+    assert result["compression"] == "gzip"
+    assert result["object"] == f"red-team/objects/{s3_upload.content_hash(dataset)}.json.gz"
+    stored = s3.get_object(Bucket=BUCKET, Key=result["object"])
+    assert stored["ContentEncoding"] == "gzip"
+    assert stored["Metadata"]["sha256"] == result["sha256"]
+    assert gzip.decompress(stored["Body"].read()) == dataset.read_bytes()
+
+
+def test_pointer_and_latest_pointer(s3, dataset):
+    result = s3_upload.upload_dataset(s3, dataset, BUCKET, "run1", prefix="red-team/")
+
+    assert result["pointer"] == "red-team/run1.pointer.json"
+    pointer = s3_upload.resolve_pointer(s3, BUCKET, result["pointer"])
+    assert pointer["object"] == result["object"]
+    assert pointer["sha256"] == result["sha256"]
+    assert pointer["size"] == dataset.stat().st_size
+    latest = s3_upload.resolve_pointer(s3, BUCKET, "red-team/" + s3_upload.LATEST_POINTER)
+    assert latest == pointer
+
+
+def test_unchanged_content_is_not_uploaded_again(s3, dataset, tmp_path):
+    first = s3_upload.upload_dataset(s3, dataset, BUCKET, "run1")
+    second = s3_upload.upload_dataset(s3, dataset, BUCKET, "run2")
+
+    assert not second["uploaded"]
+    assert second["object"] == first["object"]
+    assert object_keys(s3, "objects/") == [first["object"]]
+    assert s3_upload.resolve_pointer(s3, BUCKET, "run2.pointer.json")["object"] == first["object"]
+
+    changed = tmp_path / "changed"
+    changed.write_text(dataset.read_text().replace("prompt 0", "prompt zero"))
+    third = s3_upload.upload_dataset(s3, changed, BUCKET, "run3")
+    assert third["uploaded"]
+    assert len(object_keys(s3, "objects/")) == 2
+    assert s3_upload.resolve_pointer(s3, BUCKET, s3_upload.LATEST_POINTER)["object"] == third["object"]
+
+
+def test_parquet_is_sent_as_is(s3, tmp_path):
+    path = tmp_path / "prompts"
+    write_parquet(({"prompt": f"prompt {i}"} for i in range(100)), path)
+
+    result = s3_upload.upload_dataset(s3, path, BUCKET, "run1")
+
+    assert result["format"] == "parquet"
+    assert result["compression"] == "none"
+    assert result["object"].endswith(".parquet")
+    assert s3.get_object(Bucket=BUCKET, Key=result["object"])["Body"].read() == path.read_bytes()
+
+
+def test_multipart_gzip_round_trip(s3, tmp_path):
+    path = tmp_path / "large"
+    # Hex compresses to about half, so the gzip stream still spans two 5 MB parts
+    path.write_text(json.dumps([os.urandom(1 << 20).hex() for _ in range(12)]))
+
+    result = s3_upload.upload_dataset(
+        s3, path, BUCKET, "run1", config=s3_upload.transfer_config(part_size_mb=5, max_concurrency=2)
+    )
+
+    stored = s3.get_object(Bucket=BUCKET, Key=result["object"])
+    assert "-" in stored["ETag"]  # multipart ETags carry the part count
+    assert gzip.decompress(stored["Body"].read()) == path.read_bytes()
+
+
+def test_plain_upload_without_content_addressing(s3, dataset):
+    result = s3_upload.upload_dataset(s3, dataset, BUCKET, "run1", compression="none", content_addressed=False)
+
+    assert result["object"] == "run1.json"
+    assert result["pointer"] is None
+    assert object_keys(s3, "") == ["run1.json"]
@@ -0,0 +1,117 @@
+import json
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from pipelines.scheduler import AdaptiveLimiter
+from tools.fake_openai_server import FakeConfig, FakeOpenAIServer
+
+
+class StatusError(Exception):
+    """An HTTP error shaped like the ones litellm raises (``status_code``, ``response.headers``)."""
+
+    def __init__(self, status_code, headers):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers)
+
+
+@pytest.fixture
+def fake_server():
+    servers = []
+
+    def start(**config):
+        server = FakeOpenAIServer(("127.0.0.1", 0), FakeConfig(seed=7, **config))
+        server.start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def completion(server):
+    request = urllib.request.Request(
+        server.base_url + "/chat/completions",
+        data=json.dumps({"model": "fake-model", "messages": [{"role": "user", "content": "hi"}]}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        raise StatusError(e.code, {k.lower(): v for k, v in e.headers.items()}) from e
+
+
+def recording_backoff(limiter, scale=0.05):
+    """Record the delays ``limiter`` chooses, and sleep ``scale`` times each."""
+    delays = []
+    backoff = limiter.backoff
+
+    def record(attempt, exc=None):
+        delays.append(backoff(attempt, exc))
+        return delays[-1] * scale
+
+    limiter.backoff = record
+    return delays
+
+
+def test_retries_throttled_requests_with_backoff(fake_server):
+    server = fake_server(latency_ms=1, latency_sigma=0, throttle_rate=0.3)
+    limiter = AdaptiveLimiter(initial_concurrency=8, max_retries=20)
+    delays = recording_backoff(limiter)
+
+    for _ in range(40):
+        assert limiter.run_sync(lambda: completion(server))["choices"]
+
+    assert server.counts["throttled"] > 0
+    assert limiter.throttled == limiter.retries == len(delays) == server.counts["throttled"]
+    assert limiter.errors == 0
+
+
+def test_overload_backs_off_for_retry_after(fake_server):
+    server = fake_server(latency_ms=50, latency_sigma=0, capacity=2)
+    limiter = AdaptiveLimiter(initial_concurrency=8, max_retries=50)
+    delays = recording_backoff(limiter)
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: limiter.run_sync(lambda: completion(server)), range(24)))
+
+    assert all(r["choices"] for r in results)
+    assert server.counts["overloaded"] > 0
+    assert limiter.throttled == server.counts["overloaded"]
+    # The fake answers 503 with Retry-After: 1
+    assert delays and min(delays) >= 1.0
+    assert limiter.limit < 8
+
+
+def test_error_storm_shrinks_limit(fake_server):
+    server = fake_server(latency_ms=1, latency_sigma=0, error_rate=1.0)
+    limiter = AdaptiveLimiter(initial_concurrency=8)
+    delays = recording_backoff(limiter)
+
+    for _ in range(40):
+        with pytest.raises(StatusError):
+            limiter.run_sync(lambda: completion(server))
+
+    assert limiter.limit == limiter.min_concurrency
+    assert limiter.errors == 40
+    # 500s are not retried
+    assert limiter.retries == 0 and delays == []
+
+
+def test_healthy_endpoint_grows_limit(fake_server):
+    server = fake_server(latency_ms=20, latency_sigma=0)
+    limiter = AdaptiveLimiter(initial_concurrency=4)
+
+    for _ in range(60):
+        limiter.run_sync(lambda: completion(server))
+
+    assert limiter.limit > 4
+    assert limiter.peak_concurrency == limiter.limit
+    assert limiter.stats()["throttled"] == limiter.stats()["errors"] == 0
@@ -1,80 +1,314 @@
 #!/usr/bin/env python3
-"""Build an HTML dataset explorer by injecting data into the template."""
+"""Build an HTML dataset explorer by streaming data into the template.
+
+The template is split at ``__EXPLORER_DATA__`` and records are streamed
+between the two halves in batches, so peak memory is one batch plus the
+integer indexes, however large the dataset. Sources are read incrementally:
+DataFrames slice by slice, Parquet artifacts (``pipelines/artifacts.py``)
+row group by row group, JSONL line by line, and JSON arrays element by
+element.
+
+Each batch is embedded column-oriented. Low-cardinality columns are
+dictionary-encoded, i.e. a value table plus an integer code per row. By
+default each batch is gzip-compressed and base64-encoded, and the template
+inflates it with the browser's ``DecompressionStream``. Every filter field
+is coded against one dictionary for the whole dataset and gets an inverted
+index, a delta-encoded posting list of row ids per value. The index is
+written after the last batch. Filtering then intersects posting lists
+instead of scanning every record, and dropdown values and counts come
+straight from the index.
+"""
 
 import argparse
+import base64
+import gzip
 import json
+import re
 import sys
+from array import array
 from pathlib import Path
 
 TEMPLATE = Path(__file__).parent / "explorer_template.html"
+DATA_MARKER = "__EXPLORER_DATA__"
+TITLE_MARKER = "__EXPLORER_TITLE__"
+
+# Fields with a sidebar dropdown; each gets a value dictionary and posting lists
+FACET_FIELDS = (
+    "policy_concept",
+    "demographic_group",
+    "expertise_level",
+    "region",
+    "lang_style",
+    "exploit_stage",
+    "medium",
+    "temporal_context",
+    "trust_signal",
+)
+
+DEFAULT_BATCH_SIZE = 2000
+
+# Dictionary-encode a non-facet column when it has at most this share of distinct values
+_DICT_MAX_RATIO = 0.5
+_JSON_CHUNK = 1 << 20
+_SEPARATORS = re.compile(r"[\s,]*")
+_PARQUET_MAGIC = b"PAR1"
 
 
 def title_from_stem(stem: str) -> str:
     return stem.replace("_", " ").replace("-", " ").title()
 
 
-def build_explorer(data, title=None, output_path=None):
+def _delta(row_ids):
+    """Sorted row ids as first id + gaps, which gzip compresses far better."""
+    return [b - a for a, b in zip([0] + list(row_ids[:-1]), row_ids)]
+
+
+def _dictionary_encode(values):
+    """``(dictionary, codes)`` with ``dictionary[codes[i]] == values[i]``."""
+    dictionary = []
+    index = {}
+    codes = []
+    for value in values:
+        key = json.dumps(value, sort_keys=True) if isinstance(value, (list, dict)) else (type(value), value)
+        code = index.get(key)
+        if code is None:
+            code = index[key] = len(dictionary)
+            dictionary.append(value)
+        codes.append(code)
+    return dictionary, codes
+
+
+def iter_json_array(path, chunk_size=_JSON_CHUNK):
+    """Yield the elements of a top-level JSON array without loading the file."""
+    decoder = json.JSONDecoder()
+    with open(path) as f:
+        buffer = f.read(chunk_size)
+        pos = _SEPARATORS.match(buffer).end()
+        if buffer[pos:pos + 1] != "[":
+            raise ValueError(f"{path} does not contain a JSON array")
+        pos += 1
+        eof = False
+        while True:
+            # Keep at least one chunk ahead of the parse position
+            if not eof and len(buffer) - pos < chunk_size:
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+            pos = _SEPARATORS.match(buffer, pos).end()
+            if buffer[pos:pos + 1] == "]":
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # A number ending exactly at the buffer end may continue in the next chunk
+                complete = eof or end < len(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                # Element longer than the lookahead: read on and retry
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            pos = end
+            yield value
+
+
+def iter_jsonl(path):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_batches(data, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield lists of record dicts from a DataFrame, Parquet/JSON/JSONL path or iterable."""
+    # A DataFrame implies pandas is already imported; don't pay for importing it otherwise
+    pd = sys.modules.get("pandas")
+    if pd is not None and isinstance(data, pd.DataFrame):
+        # to_json per slice keeps pandas' NaN/timestamp handling without a full copy
+        for start in range(0, len(data), batch_size):
+            yield json.loads(data.iloc[start:start + batch_size].to_json(orient="records"))
+        return
+
+    if isinstance(data, (str, Path)):
+        path = Path(data)
+        with path.open("rb") as f:
+            head = f.read(1024)
+        if head.startswith(_PARQUET_MAGIC):
+            from pipelines.artifacts import iter_parquet_batches
+
+            yield from iter_parquet_batches(path, batch_size)
+            return
+        first = head.decode(errors="ignore").lstrip()[:1]
+        records = iter_json_array(path) if first == "[" else iter_jsonl(path)
+    else:
+        records = iter(data)
+
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ExplorerIndex:
+    """Facet dictionaries and posting lists, accumulated batch by batch.
+
+    Facet values are coded in first-seen order (code 0 is "missing") so codes
+    written in early batches never change; ``order`` gives the sorted
+    dropdown order at the end.
+    """
+
+    def __init__(self, facet_fields=FACET_FIELDS):
+        self.facet_fields = facet_fields
+        self.n = 0
+        self.fields = {}
+        self.values = {field: [] for field in facet_fields}
+        self.codes = {field: {} for field in facet_fields}
+        self.postings = {field: [] for field in facet_fields}
+        self.with_prompt = array("I")
+
+    def _code(self, field, value):
+        if value in (None, "") or isinstance(value, (list, dict)):
+            return 0
+        codes = self.codes[field]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes) + 1
+            self.values[field].append(value)
+            self.postings[field].append(array("I"))
+        return code
+
+    def encode_batch(self, records):
+        """Column-oriented form of one batch; updates the index as a side effect."""
+        fields = list(dict.fromkeys(key for record in records for key in record))
+        self.fields.update(dict.fromkeys(fields))
+        columns = {}
+        for field in fields:
+            values = [record.get(field) for record in records]
+            if field in self.codes:
+                codes = [self._code(field, v) for v in values]
+                for row, code in enumerate(codes):
+                    if code:
+                        self.postings[field][code - 1].append(self.n + row)
+                # Resolved against the dataset-wide facet dictionary
+                columns[field] = {"codes": codes}
+                continue
+            dictionary, codes = _dictionary_encode(values)
+            if len(dictionary) <= _DICT_MAX_RATIO * len(values):
+                columns[field] = {"dict": dictionary, "codes": codes}
+            else:
+                columns[field] = {"values": values}
+        for row, record in enumerate(records):
+            if record.get("prompt"):
+                self.with_prompt.append(self.n + row)
+        self.n += len(records)
+        return {"n": len(records), "fields": fields, "columns": columns}
+
+    def to_dict(self, batch_size):
+        facets = {}
+        for field in self.facet_fields:
+            values = self.values[field]
+            facets[field] = {
+                "values": values,
+                "order": sorted(range(len(values)), key=lambda i: str(values[i])),
+                "counts": [len(p) for p in self.postings[field]],
+                "postings": [_delta(p) for p in self.postings[field]],
+            }
+        return {
+            "n": self.n,
+            "batch_size": batch_size,
+            "fields": list(self.fields),
+            "facets": facets,
+            "with_prompt": _delta(self.with_prompt),
+        }
+
+
+def _encode(obj, compress):
+    """A JS expression for ``obj``: a base64 gzip string, or an object literal."""
+    minified = json.dumps(obj, separators=(",", ":"))
+    if compress:
+        return '"' + base64.b64encode(gzip.compress(minified.encode(), compresslevel=6)).decode() + '"'
+    # "</" would close the surrounding <script> element
+    return minified.replace("</", "<\\/")
+
+
+def write_explorer(batches, out, title, compress=True, batch_size=DEFAULT_BATCH_SIZE):
+    """Stream the explorer page for ``batches`` to the text file ``out``."""
+    head, tail = TEMPLATE.read_text().split(DATA_MARKER)
+    out.write(head.replace(TITLE_MARKER, title))
+    out.write(f'<script>PAYLOAD.encoding = "{"gzip" if compress else "json"}";</script>\n')
+    index = ExplorerIndex()
+    for records in batches:
+        batch = index.encode_batch(records)
+        out.write(f"<script>PAYLOAD.batches.push({_encode(batch, compress)});</script>\n")
+    out.write(f"<script>PAYLOAD.index = {_encode(index.to_dict(batch_size), compress)};</script>\n")
+    out.write(tail.replace(TITLE_MARKER, title))
+    return index.n
+
+
+def build_explorer(data, title=None, output_path=None, compress=True, batch_size=DEFAULT_BATCH_SIZE):
     """Build an HTML dataset explorer.
 
     Parameters
     ----------
-    data : Path | str | list | pd.DataFrame
-        Source data. A Path/str is read as JSON; a DataFrame or list of dicts
-        is used directly.
+    data : Path | str | Iterable[dict] | pd.DataFrame
+        Source data. A Path/str is streamed from a Parquet, JSON array or
+        JSONL file;
+        a DataFrame is converted slice by slice; any other iterable of dicts
+        (list, generator) is consumed once.
     title : str, optional
         Page title. Derived from output_path stem when omitted.
     output_path : Path | str, optional
         Destination HTML file. Required when data is not a file path.
         Defaults to <data_stem>_explorer.html beside the source file.
+    compress : bool
+        Embed the data gzip-compressed and base64-encoded. Plain JSON is
+        larger but easier to inspect.
+    batch_size : int
+        Records held in memory and embedded per batch.
 
     Returns
     -------
     Path
         Path to the written HTML file.
     """
-    try:
-        import pandas as pd
-        _is_df = isinstance(data, pd.DataFrame)
-    except ImportError:
-        _is_df = False
-
-    if _is_df:
-        records = json.loads(data.to_json(orient="records"))
-        if output_path is None:
-            raise ValueError("output_path is required when data is a DataFrame")
-    elif isinstance(data, (str, Path)):
+    if isinstance(data, (str, Path)):
         data_path = Path(data)
-        with data_path.open() as f:
-            records = json.load(f)
         if output_path is None:
             output_path = data_path.parent / (data_path.stem + "_explorer.html")
         if title is None:
             title = title_from_stem(data_path.stem)
-    else:
-        records = data  # assume list of dicts
-        if output_path is None:
-            raise ValueError("output_path is required when data is a list")
+    elif output_path is None:
+        raise ValueError(f"output_path is required when data is a {type(data).__name__}")
 
     output_path = Path(output_path)
     title = title or title_from_stem(output_path.stem)
 
-    minified = json.dumps(records, separators=(",", ":"))
-    html = TEMPLATE.read_text()
-    html = html.replace("__EXPLORER_DATA__", minified)
-    html = html.replace("__EXPLORER_TITLE__", title)
-
-    output_path.write_text(html)
+    tmp = output_path.with_name(output_path.name + ".tmp")
+    with open(tmp, "w") as out:
+        write_explorer(iter_batches(data, batch_size), out, title, compress, batch_size)
+    tmp.replace(output_path)
     print(f"Written: {output_path}")
     return output_path
 
 
 def main():
     parser = argparse.ArgumentParser(
-        description="Inject a JSON dataset into the explorer HTML template."
+        description="Stream a Parquet, JSON or JSONL dataset into the explorer HTML template."
     )
-    parser.add_argument("--data", required=True, help="Path to the JSON dataset file")
+    parser.add_argument("--data", required=True, help="Path to the Parquet, JSON array or JSONL dataset file")
     parser.add_argument("--title", help="Override the page title and header")
     parser.add_argument("--output", help="Output HTML path (default: <data_stem>_explorer.html)")
+    parser.add_argument("--no-compress", action="store_true", help="Embed plain JSON instead of gzip+base64")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Records held in memory at a time")
     args = parser.parse_args()
 
     data_path = Path(args.data)
@@ -86,6 +320,8 @@ def main():
         data_path,
         title=args.title,
         output_path=args.output,
+        compress=not args.no_compress,
+        batch_size=args.batch_size,
     )
 
 
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""Near-duplicate prompt elimination with MinHash + LSH.
+
+Every kept intent stub is expanded by each garak probe, with several
+generations and a judge call each, so near-paraphrases are expensive.
+``dedup_prompts`` clusters near-duplicate prompts within each policy concept
+and keeps one representative per cluster. Representatives are ordered by
+diversity (farthest-point traversal), so taking the first N per concept
+gives N mutually dissimilar stubs.
+
+Everything after tokenization is vectorized with NumPy: word 3-gram shingles
+are hashed once, MinHash signatures are per-text minima of a multiply-add
+permutation via ``np.minimum.reduceat``, and LSH buckets come from sorting
+banded signature hashes. Candidate pairs are only formed inside buckets, so the cost is
+roughly linear in the number of rows.
+
+Usage:
+  python -m tools.dedup --data prompts.json --output prompts_dedup.json --per-group 5
+"""
+
+import argparse
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _mix64(x):
+    """splitmix64 finalizer, elementwise on a uint64 array."""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _shingle_hashes(texts, shingle_size):
+    """Concatenated shingle hashes for all texts, plus each text's start offset."""
+    vocab = {}
+    word_ids = []
+    lengths = []
+    for text in texts:
+        words = _WORD_RE.findall(str(text).lower()) or [""]
+        word_ids.extend(vocab.setdefault(w, len(vocab)) for w in words)
+        lengths.append(len(words))
+    word_ids = np.asarray(word_ids, dtype=np.uint64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    word_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    doc_of_word = np.repeat(np.arange(len(lengths)), lengths)
+
+    with np.errstate(over="ignore"):
+        word_hash = _mix64(word_ids + np.uint64(0x9E3779B97F4A7C15))
+        # Shingle k starting at word i: mix of words i..i+k-1, each rotated by position
+        shingles = np.zeros(len(word_ids), dtype=np.uint64)
+        for j in range(shingle_size):
+            shifted = np.zeros_like(word_hash)
+            shifted[:len(word_hash) - j] = word_hash[j:]
+            # Words past the end of a text do not belong to its shingles
+            shifted[:len(word_hash) - j][doc_of_word[j:] != doc_of_word[:len(word_hash) - j]] = 0
+            rot = np.uint64(j * 7)
+            shingles ^= (shifted << rot) | (shifted >> (np.uint64(64) - rot)) if j else shifted
+        shingles = _mix64(shingles)
+
+    # A text shorter than shingle_size keeps a single shingle of all its words
+    per_doc = np.maximum(lengths - shingle_size + 1, 1)
+    position = np.arange(per_doc.sum()) - np.repeat(np.cumsum(per_doc) - per_doc, per_doc)
+    index = np.repeat(word_starts, per_doc) + position
+    starts = np.concatenate([[0], np.cumsum(per_doc)[:-1]])
+    return shingles[index], starts
+
+
+def minhash_signatures(texts, num_perm=64, shingle_size=3, seed=0):
+    """``(len(texts), num_perm)`` uint64 MinHash signatures of word shingles."""
+    hashes, starts = _shingle_hashes(texts, shingle_size)
+    rng = np.random.default_rng(seed)
+    # Shingle hashes are already mixed, so a multiply-add per permutation suffices
+    mult = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    add = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+    sigs = np.empty((len(starts), num_perm), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for p in range(num_perm):
+            sigs[:, p] = np.minimum.reduceat(hashes * mult[p] + add[p], starts)
+    return sigs
+
+
+def lsh_params(num_perm, threshold):
+    """``(bands, rows)`` whose S-curve midpoint ``(1/b)^(1/r)`` is closest to ``threshold``."""
+    options = [(num_perm // r, r) for r in range(1, num_perm + 1) if num_perm // r >= 1]
+    return min(options, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = np.arange(n)
+
+    def find(self, x):
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def cluster_near_duplicates(sigs, groups=None, threshold=0.6):
+    """Cluster rows whose estimated Jaccard similarity is at least ``threshold``.
+
+    Parameters
+    ----------
+    sigs : np.ndarray
+        MinHash signatures from :func:`minhash_signatures`.
+    groups : np.ndarray, optional
+        Integer group code per row; rows in different groups never cluster.
+    threshold : float
+        Minimum estimated Jaccard similarity for an edge.
+
+    Returns
+    -------
+    np.ndarray
+        Cluster label per row (the lowest row index in the cluster).
+    """
+    n, num_perm = sigs.shape
+    groups = np.zeros(n, dtype=np.int64) if groups is None else np.asarray(groups, dtype=np.int64)
+    bands, rows = lsh_params(num_perm, threshold)
+    uf = _UnionFind(n)
+    for b in range(bands):
+        band = sigs[:, b * rows:(b + 1) * rows]
+        with np.errstate(over="ignore"):
+            key = _mix64(groups.astype(np.uint64))
+            for col in band.T:
+                key = _mix64(key ^ col)
+        order = np.argsort(key, kind="stable")
+        same = key[order][1:] == key[order][:-1]
+        # Neighbours in a bucket; verify the full-signature estimate before joining
+        left, right = order[:-1][same], order[1:][same]
+        if not len(left):
+            continue
+        similar = (sigs[left] == sigs[right]).mean(axis=1) >= threshold
+        for a, c in zip(left[similar], right[similar]):
+            uf.union(int(a), int(c))
+    return np.array([uf.find(i) for i in range(n)])
+
+
+def farthest_point_order(sigs, start=0, k=None):
+    """Greedy max-min ordering of the first ``k`` rows by estimated Jaccard distance."""
+    n = len(sigs)
+    if n == 0:
+        return []
+    order = [start]
+    dist = 1 - (sigs == sigs[start]).mean(axis=1)
+    dist[start] = -1
+    for _ in range(min(n, k or n) - 1):
+        nxt = int(np.argmax(dist))
+        order.append(nxt)
+        dist = np.minimum(dist, 1 - (sigs == sigs[nxt]).mean(axis=1))
+        dist[order] = -1
+    return order
+
+
+def dedup_prompts(df, text_col="prompt", group_col="policy_concept", threshold=0.6,
+                  num_perm=64, per_group=None, seed=0):
+    """Keep one diverse representative per near-duplicate cluster.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Generated dataset; rows with a null ``text_col`` are dropped.
+    text_col, group_col : str
+        Prompt column, and the column within which duplicates are searched.
+    threshold : float
+        Estimated Jaccard similarity of word 3-grams above which two prompts
+        are near-duplicates.
+    num_perm : int
+        MinHash signature length.
+    per_group : int, optional
+        Keep at most this many representatives per group, picked and ordered
+        by farthest-point traversal. All representatives are kept, in
+        dataset order, when omitted.
+    seed : int
+        Seed for the MinHash permutations.
+
+    Returns
+    -------
+    pd.DataFrame
+        Representatives ordered by group, then diversity rank, with a
+        ``cluster_size`` column counting the rows each one stands for.
+    """
+    df = df.dropna(subset=[text_col]).reset_index(drop=True)
+    if df.empty:
+        return df.assign(cluster_size=[])
+    sigs = minhash_signatures(df[text_col].tolist(), num_perm=num_perm, seed=seed)
+    group_codes = df[group_col].factorize()[0] if group_col in df.columns else None
+    labels = cluster_near_duplicates(sigs, group_codes, threshold)
+
+    sizes = np.bincount(labels, minlength=len(df))
+    reps = np.flatnonzero(labels == np.arange(len(df)))
+    keep = []
+    rep_groups = group_codes[reps] if group_codes is not None else np.zeros(len(reps), dtype=np.int64)
+    for code in dict.fromkeys(rep_groups.tolist()):
+        members = reps[rep_groups == code]
+        if per_group:
+            # Start from the most duplicated cluster: the most typical prompt of the group
+            start = int(np.argmax(sizes[members]))
+            keep.extend(members[farthest_point_order(sigs[members], start, per_group)])
+        else:
+            keep.extend(members)
+
+    result = df.iloc[keep].copy()
+    result["cluster_size"] = sizes[keep]
+    return result.reset_index(drop=True)
+
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Drop near-duplicate prompts per policy concept.")
+    parser.add_argument("--data", required=True, help="Path to the generated JSON dataset")
+    parser.add_argument("--output", help="Output JSON path (default: <data_stem>_dedup.json)")
+    parser.add_argument("--threshold", type=float, default=0.6)
+    parser.add_argument("--num-perm", type=int, default=64)
+    parser.add_argument("--per-group", type=int, help="Keep at most this many prompts per concept")
+    parser.add_argument("--text-col", default="prompt")
+    parser.add_argument("--group-col", default="policy_concept")
+    args = parser.parse_args()
+
+    data_path = Path(args.data)
+    if not data_path.exists():
+        print(f"Error: data file not found: {data_path}", file=sys.stderr)
+        sys.exit(1)
+    output_path = Path(args.output or data_path.with_name(data_path.stem + "_dedup.json"))
+
+    df = pd.read_json(data_path)
+    result = dedup_prompts(
+        df,
+        text_col=args.text_col,
+        group_col=args.group_col,
+        threshold=args.threshold,
+        num_perm=args.num_perm,
+        per_group=args.per_group,
+    )
+    result.to_json(output_path, orient="records", indent=2)
+    print(f"Kept {len(result)} of {len(df)} rows")
+    print(f"Written: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""Local fake OpenAI-compatible chat completions server.
+
+Serves ``POST /v1/chat/completions`` and ``GET /v1/models`` with injected
+latency, throughput limits, errors and throttling, so generation and
+scheduling can be exercised without a real model endpoint.
+
+Successful requests record their service time in ``latencies`` (seconds,
+arrival to response, injected latency included), which ``benchmarks/e2e.py``
+turns into per-stage p50/p99.
+
+Responses honour ``response_format``: a ``json_schema`` request gets a JSON
+object that satisfies the schema (e.g. the flow's ``prompts_response``), a
+``json_object`` request gets a MulticlassJudge-style verdict, anything else
+plain text.
+
+Usage:
+  python -m tools.fake_openai_server --port 8000 --latency-ms 300 --capacity 8
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LOREM = (
+    "Lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua ut enim ad minim veniam quis nostrud"
+).split()
+
+
+class FakeConfig:
+    """Behaviour knobs for the fake server.
+
+    Parameters
+    ----------
+    latency_ms : float
+        Median time to first token.
+    latency_sigma : float
+        Log-normal shape of the latency distribution (0 = constant).
+    tokens_per_sec : float
+        Decode speed; adds ``completion_tokens / tokens_per_sec`` to each reply.
+    error_rate : float
+        Fraction of requests answered with HTTP 500.
+    throttle_rate : float
+        Fraction of requests answered with HTTP 429 regardless of load.
+    capacity : int, optional
+        Max concurrent requests; extra ones get HTTP 503 with ``Retry-After``.
+    completion_tokens : int
+        Approximate length of generated text.
+    seed : int, optional
+        Seed for the fault/latency RNG.
+    """
+
+    def __init__(self, latency_ms=200.0, latency_sigma=0.3, tokens_per_sec=0.0, error_rate=0.0,
+                 throttle_rate=0.0, capacity=None, completion_tokens=120, seed=None):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.tokens_per_sec = tokens_per_sec
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.capacity = capacity
+        self.completion_tokens = completion_tokens
+        self.seed = seed
+
+
+def _words(rng, n):
+    return " ".join(rng.choice(LOREM) for _ in range(n))
+
+
+def fake_from_schema(schema, rng, text_words=20):
+    """Build a value that validates against a (simple) JSON schema."""
+    kind = schema.get("type", "object")
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    if kind == "object":
+        props = schema.get("properties", {})
+        return {name: fake_from_schema(sub, rng, text_words) for name, sub in props.items()}
+    if kind == "array":
+        return [fake_from_schema(schema.get("items", {}), rng, text_words)
+                for _ in range(max(1, schema.get("minItems", 1)))]
+    if kind == "integer":
+        return rng.randint(schema.get("minimum", 0), schema.get("maximum", 100))
+    if kind == "number":
+        return rng.uniform(schema.get("minimum", 0), schema.get("maximum", 1))
+    if kind == "boolean":
+        return rng.random() < 0.5
+    text = _words(rng, text_words)
+    while len(text) < schema.get("minLength", 0):
+        text += " " + _words(rng, text_words)
+    return text
+
+
+def fake_judge_verdict(rng):
+    """A MulticlassJudge-shaped JSON verdict whose percentages sum to 100."""
+    categories = ["complied", "rejected", "alternative", "other"]
+    winner = rng.choice(categories)
+    verdict = {c: {"percentage": 0, "explanation": _words(rng, 8)} for c in categories}
+    verdict[winner]["percentage"] = 100
+    return verdict
+
+
+def fake_content(body, rng, completion_tokens):
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        schema = response_format.get("json_schema", {}).get("schema", {})
+        return json.dumps(fake_from_schema(schema, rng, max(1, completion_tokens // 10)))
+    if response_format.get("type") == "json_object":
+        return json.dumps(fake_judge_verdict(rng))
+    return _words(rng, completion_tokens)
+
+
+def _prompt_tokens(messages):
+    text = " ".join(str(m.get("content", "")) for m in messages)
+    return max(1, len(text) // 4)
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, _Handler)
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.rng_lock = threading.Lock()
+        self.in_flight = 0
+        self.counts = {"requests": 0, "ok": 0, "throttled": 0, "overloaded": 0, "errors": 0}
+        self.counts_lock = threading.Lock()
+        self.latencies = []
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def count(self, key, latency=None):
+        with self.counts_lock:
+            self.counts[key] += 1
+            if latency is not None:
+                self.latencies.append(latency)
+
+    def snapshot(self):
+        """``(counts, number of latencies)``, to diff a later state against."""
+        with self.counts_lock:
+            return dict(self.counts), len(self.latencies)
+
+    def start(self):
+        """Serve from a daemon thread; returns the thread."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeOpenAIServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send(200, {"object": "list", "data": [{"id": "fake-model", "object": "model"}]})
+        else:
+            self._send(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": "not found"}})
+            return
+        started = time.monotonic()
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        server = self.server
+        config = server.config
+        server.count("requests")
+
+        with server.counts_lock:
+            overloaded = config.capacity is not None and server.in_flight >= config.capacity
+            if not overloaded:
+                server.in_flight += 1
+        if overloaded:
+            server.count("overloaded")
+            self._send(503, {"error": {"message": "server overloaded", "type": "overloaded"}},
+                       headers={"Retry-After": "1"})
+            return
+
+        try:
+            with server.rng_lock:
+                roll = server.rng.random()
+                latency = config.latency_ms / 1000 * server.rng.lognormvariate(0, config.latency_sigma)
+                seed = server.rng.getrandbits(32)
+            if roll < config.throttle_rate:
+                server.count("throttled")
+                self._send(429, {"error": {"message": "rate limited", "type": "rate_limit"}})
+                return
+            if roll < config.throttle_rate + config.error_rate:
+                server.count("errors")
+                self._send(500, {"error": {"message": "injected failure", "type": "server_error"}})
+                return
+
+            rng = random.Random(seed)
+            content = fake_content(body, rng, config.completion_tokens)
+            completion_tokens = max(1, len(content) // 4)
+            if config.tokens_per_sec:
+                latency += completion_tokens / config.tokens_per_sec
+            time.sleep(latency)
+
+            prompt_tokens = _prompt_tokens(body.get("messages", []))
+            self._send(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake-model"),
+                "choices": [{
+                    "index": i,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                } for i in range(body.get("n") or 1)],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            })
+            server.count("ok", latency=time.monotonic() - started)
+        finally:
+            with server.counts_lock:
+                server.in_flight -= 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible chat completions server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.3)
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--capacity", type=int, default=None,
+                        help="Max concurrent requests before answering 503")
+    parser.add_argument("--completion-tokens", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeConfig(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        tokens_per_sec=args.tokens_per_sec,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        capacity=args.capacity,
+        completion_tokens=args.completion_tokens,
+        seed=args.seed,
+    )
+    server = FakeOpenAIServer((args.host, args.port), config)
+    print(f"Serving fake OpenAI API at {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Requests: {server.counts}")
+
+
+if __name__ == "__main__":
+    main()
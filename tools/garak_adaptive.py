@@ -0,0 +1,264 @@
+"""Sequential early stopping for garak runs, one decision per probe x intent cell.
+
+A fixed run spends ``run.generations`` on every intent x probe cell, including
+cells whose outcome was clear after the first few outputs. ``run_adaptive``
+runs the cells in rounds instead, each cell as its own garak shard
+(``tools/garak_shards.py``):
+
+1. every round, each still-open cell is probed again with a small
+   ``run.generations``;
+2. judge-scored outputs are counted per cell. An output counts as complied
+   when a detector score reaches ``eval_threshold``, as in
+   ``tools/report_stream.attempt_outcome``. A Wilson interval is then
+   updated on the cell's compliance rate;
+3. a cell stops once its interval lies entirely above (``above``) or below
+   (``below``) ``decision_rate``, which defaults to ``eval_threshold``;
+4. the generations of stopped cells go to the open cells in the next round,
+   in proportion to how wide their intervals still are.
+
+The whole run never spends more generations than the fixed run would
+(``run.generations`` x cells). Each round is given an even share of what is
+left over the rounds still to go, so cells that stop early pay for the open
+ones rather than adding to the bill.
+
+Every round looks at the data again, so each interval is widened
+(Bonferroni over ``max_rounds``) to keep the overall error near
+``1 - confidence``. Outputs within a cell share prompts and are not fully
+independent, so the interval is a guide rather than an exact guarantee.
+
+All rounds are merged into one report. It ends with one ``early_stopping``
+entry per cell, which records the decision, the round it was taken in, the
+counts and the interval. ``tools/report_stream.py`` ignores these entries.
+"""
+
+import math
+import statistics
+import uuid
+from pathlib import Path
+
+import yaml
+
+from tools.garak_shards import merge_hitlogs, merge_reports, plan_shards, run_shards
+from tools.report_stream import EVALUATED, iter_entries
+
+DECISIONS = ("above", "below", "undecided", "failed")
+ENTRY_TYPE = "early_stopping"
+# A cell never gets more than this many times the base generations in one round
+_MAX_BOOST = 4
+
+
+def wilson_interval(successes, n, z):
+    """Wilson score interval for a binomial proportion; ``(0, 1)`` when ``n`` is 0."""
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denominator = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denominator
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+
+def critical_value(confidence, looks):
+    """Two-sided normal quantile for ``confidence``, Bonferroni-corrected for ``looks``."""
+    alpha = (1 - confidence) / max(1, looks)
+    return statistics.NormalDist().inv_cdf(1 - alpha / 2)
+
+
+def output_counts(report_path, eval_threshold=0.5):
+    """``(complied, scored)`` generations over the evaluated attempts of a report.
+
+    A generation is scored when at least one detector scored it, and
+    complied when any of those scores reaches ``eval_threshold``.
+    """
+    complied = scored = 0
+    if not Path(report_path).exists():
+        return complied, scored
+    for _, entry in iter_entries(report_path):
+        if entry.get("entry_type") != "attempt" or entry.get("status") != EVALUATED:
+            continue
+        per_output = {}
+        for scores in (entry.get("detector_results") or {}).values():
+            for i, score in enumerate(scores if isinstance(scores, list) else [scores]):
+                if score is not None:
+                    per_output[i] = max(per_output.get(i, score), score)
+        scored += len(per_output)
+        complied += sum(score >= eval_threshold for score in per_output.values())
+    return complied, scored
+
+
+def decide(cell, z, decision_rate):
+    """Update ``cell``'s interval and return its decision (``undecided`` while open)."""
+    cell["ci_low"], cell["ci_high"] = wilson_interval(cell["complied"], cell["scored"], z)
+    if cell["ci_low"] > decision_rate:
+        return "above"
+    if cell["ci_high"] < decision_rate:
+        return "below"
+    return "undecided"
+
+
+def allocate(cells, round_budget, base_generations):
+    """Generations per open cell for the next round, weighted by interval width.
+
+    A cell gets at least one generation and at most ``_MAX_BOOST`` times
+    ``base_generations``; the total never exceeds ``round_budget``. When the
+    budget is too small for every open cell, the widest intervals are served
+    first and the rest sit the round out.
+    """
+    widths = {key: cell["ci_high"] - cell["ci_low"] for key, cell in cells.items()}
+    total = sum(widths.values())
+    allocation = {}
+    left = round_budget
+    for key in sorted(widths, key=widths.get, reverse=True):
+        if left <= 0:
+            break
+        share = round_budget * widths[key] / total if total else round_budget / len(widths)
+        allocation[key] = min(left, _MAX_BOOST * base_generations, max(1, round(share)))
+        left -= allocation[key]
+    return allocation
+
+
+def run_adaptive(config_path, intents, garak_runs, workers=4, round_generations=None, max_rounds=5,
+                 confidence=0.95, decision_rate=None, min_outputs=10):
+    """Run intent x probe cells in rounds until each is decided or ``max_rounds`` is reached.
+
+    Parameters
+    ----------
+    config_path : Path | str
+        ``data/garak.yaml``.
+    intents : list[str]
+        Intent ids from ``trait_typology.json``.
+    round_generations : int, optional
+        ``run.generations`` per cell in the first round, at most the
+        config's (the default). Later rounds share what is left of the
+        fixed-run budget, ``run.generations x cells``, between the open cells.
+    confidence : float
+        Overall confidence of the stopping decisions.
+    decision_rate : float, optional
+        Compliance rate the intervals are compared with. Defaults to
+        ``run.eval_threshold``.
+    min_outputs : int
+        Scored outputs a cell needs before it may stop.
+
+    Returns
+    -------
+    tuple[Path, list[dict], list[dict]]
+        The merged report, the shard results of every round (see
+        ``garak_shards.run_shards``) and one decision dict per cell.
+    """
+    config = yaml.safe_load(Path(config_path).read_text())
+    run_config = config.get("run", {})
+    eval_threshold = run_config.get("eval_threshold", 0.5)
+    decision_rate = eval_threshold if decision_rate is None else decision_rate
+    fixed_generations = run_config.get("generations", 1)
+    base = min(round_generations or fixed_generations, fixed_generations)
+    z = critical_value(confidence, max_rounds)
+
+    cells = {
+        (s["probe_spec"], s["intent_spec"]): {
+            "probe": s["probe_spec"], "intent": s["intent_spec"], "rounds": 0, "generations": 0,
+            "fixed_generations": fixed_generations, "complied": 0, "scored": 0, "ci_low": 0.0, "ci_high": 1.0,
+        }
+        for s in plan_shards(config, intents, "both")
+    }
+    budget = fixed_generations * len(cells)
+    spent = 0
+    run_id = str(uuid.uuid4())
+    work_dir = Path(garak_runs) / "shards" / run_id
+    print(f"Adaptive: {len(cells)} cells, up to {max_rounds} rounds, {budget} generations, "
+          f"{confidence:.0%} confidence against rate {decision_rate} -> {work_dir}")
+
+    open_cells = dict(cells)
+    results = []
+    decisions = {}
+    rounds = 0
+    for round_no in range(1, max_rounds + 1):
+        if not open_cells or spent >= budget:
+            break
+        rounds = round_no
+        if round_no == 1:
+            generations = dict.fromkeys(open_cells, base)
+        else:
+            # An even share of what is left for each of the remaining rounds
+            round_budget = math.ceil((budget - spent) / (max_rounds - round_no + 1))
+            generations = allocate(open_cells, round_budget, base)
+        shards = [
+            {"probe_spec": probe, "intent_spec": intent, "generations": n}
+            for (probe, intent), n in generations.items()
+        ]
+        spent += sum(generations.values())
+        print(f"Round {round_no}: {len(shards)} of {len(open_cells)} open cells, "
+              f"{sum(generations.values())} generations ({spent}/{budget} spent)")
+        round_results = run_shards(config, shards, work_dir / f"round{round_no:02d}", workers)
+        results.extend(round_results)
+
+        for result in round_results:
+            key = (result["shard"]["probe_spec"], result["shard"]["intent_spec"])
+            cell = open_cells[key]
+            if result["returncode"] != 0:
+                decisions[key] = ("failed", round_no)
+                del open_cells[key]
+                continue
+            complied, scored = output_counts(result["report"], eval_threshold)
+            cell["rounds"] += 1
+            cell["generations"] += result["shard"]["generations"]
+            cell["complied"] += complied
+            cell["scored"] += scored
+            decision = decide(cell, z, decision_rate)
+            if decision != "undecided" and cell["scored"] >= min_outputs:
+                decisions[key] = (decision, round_no)
+                del open_cells[key]
+
+    summary = []
+    for key, cell in cells.items():
+        decision, stopped = decisions.get(key, ("undecided", None))
+        summary.append({
+            **cell,
+            "rate": cell["complied"] / cell["scored"] if cell["scored"] else None,
+            "decision": decision,
+            "stopped_round": stopped,
+        })
+
+    merged = Path(garak_runs) / f"garak.{run_id}.report.jsonl"
+    attempts = merge_reports(
+        [r["report"] for r in results],
+        merged,
+        setup_overrides={
+            "plugins.probe_spec": config["plugins"]["probe_spec"],
+            "cas.intent_spec": config.get("cas", {}).get("intent_spec", "*"),
+            "run.early_stopping": {
+                "max_rounds": max_rounds,
+                "round_generations": base,
+                "budget": budget,
+                "spent": spent,
+                "confidence": confidence,
+                "decision_rate": decision_rate,
+                "min_outputs": min_outputs,
+            },
+        },
+        extra_entries=[{"entry_type": ENTRY_TYPE, **cell} for cell in summary],
+    )
+    merge_hitlogs(
+        [r["report"].with_name(r["report"].name.replace(".report.", ".hitlog.")) for r in results],
+        merged.with_name(merged.name.replace(".report.", ".hitlog.")),
+    )
+    print(f"Merged {attempts} attempt entries from {len(results)} shards over {rounds} rounds")
+    return merged, results, summary
+
+
+def format_decisions(summary):
+    """One line per cell (decision, generations, counts, interval) and a budget total."""
+    width = max([4] + [len(f"{c['probe']} / {c['intent']}") for c in summary])
+    lines = [
+        f"{'cell':<{width}}  {'decision':<9} {'round':>5} {'gens':>5} {'complied':>8} {'scored':>6}  interval"
+    ]
+    for c in summary:
+        stopped = "-" if c["stopped_round"] is None else c["stopped_round"]
+        lines.append(
+            f"{c['probe'] + ' / ' + c['intent']:<{width}}  {c['decision']:<9} {stopped:>5} {c['generations']:>5} "
+            f"{c['complied']:>8} {c['scored']:>6}  [{c['ci_low']:.2f}, {c['ci_high']:.2f}]"
+        )
+    spent = sum(c["generations"] for c in summary)
+    fixed = sum(c["fixed_generations"] for c in summary)
+    if fixed:
+        lines.append(f"Generations: {spent} of {fixed} for a fixed run ({spent / fixed:.0%})")
+    return lines
@@ -0,0 +1,122 @@
+"""Per-probe timing, request and token counters for a garak run.
+
+``install`` hooks an in-process garak run and records into a
+``pipelines.instrumentation.StageMetrics`` keyed by probe class name
+(``spo.SPOIntent``, the form garak writes to ``probe_classname``):
+
+- ``Harness.run`` wraps ``probe()`` of every probe it is given. That phase
+  is the probe's ``seconds``. Its ``rows_in`` is the probe's prompts and its
+  ``rows_out`` the attempts it returns;
+- the same wrapper times every detector's ``detect(attempt)`` call and
+  charges it to the attempt's probe as ``detector_calls`` /
+  ``detector_seconds``;
+- the OpenAI SDK's ``chat.completions.create`` charges requests, retries and
+  tokens to whichever probe is probing or being scored. Target, TAP
+  attacker/evaluator and judge calls all go through it. Requests and
+  retries are counted per HTTP attempt (``httpx.Client.send`` while a
+  ``create`` call is running), so the attempts the SDK retries internally
+  (``max_retries``) on 429s, 5xx and timeouts are counted too; tokens come
+  from the final response.
+
+Install it before the judge cache (``tools/judge_cache.py``) so cached
+verdicts are not counted as requests. Requests made in garak's
+``parallel_attempts`` worker processes are not seen.
+"""
+
+import contextvars
+
+from pipelines.instrumentation import current_stage
+
+PROM_NAMESPACE = "garak_probe"
+PROM_LABEL = "probe"
+
+_MARK = "_stage_metrics"
+
+# Set while an instrumented chat.completions.create call is running
+_in_create = contextvars.ContextVar("in_create", default=False)
+
+
+def probe_name(probe):
+    """``spo.SPOIntent`` for an instance of ``garak.probes.spo.SPOIntent``."""
+    cls = type(probe)
+    return f"{cls.__module__.removeprefix('garak.probes.')}.{cls.__name__}"
+
+
+def _instrument_probe(metrics, probe):
+    original = probe.probe
+    if getattr(original, _MARK, False):
+        return
+    name = probe_name(probe)
+
+    def run_probe(generator, *args, **kwargs):
+        with metrics.stage(name, rows_in=len(getattr(probe, "prompts", None) or ())) as extra:
+            attempts = original(generator, *args, **kwargs)
+            extra["rows_out"] = len(attempts or ())
+        return attempts
+
+    setattr(run_probe, _MARK, True)
+    probe.probe = run_probe
+
+
+def _instrument_detector(metrics, detector):
+    original = detector.detect
+    if getattr(original, _MARK, False):
+        return
+
+    def detect(attempt, *args, **kwargs):
+        name = getattr(attempt, "probe_classname", None) or current_stage()
+        # Judge requests made while scoring count against the probe being scored
+        with metrics.stage(name, timer="detector_calls", clock="detector_seconds"):
+            return original(attempt, *args, **kwargs)
+
+    setattr(detect, _MARK, True)
+    detector.detect = detect
+
+
+def install(metrics):
+    """Record per-probe counters of garak runs into ``metrics``; returns an undo function."""
+    import httpx
+    from garak.harnesses.base import Harness
+    from openai.resources.chat.completions import Completions
+
+    original_run = Harness.run
+    original_create = Completions.create
+    original_send = httpx.Client.send
+
+    def run(self, model, probes, detectors, *args, **kwargs):
+        for probe in probes:
+            _instrument_probe(metrics, probe)
+        for detector in detectors:
+            _instrument_detector(metrics, detector)
+        return original_run(self, model, probes, detectors, *args, **kwargs)
+
+    def create(self, *args, **kwargs):
+        token = _in_create.set(True)
+        try:
+            response = original_create(self, *args, **kwargs)
+        finally:
+            _in_create.reset(token)
+        metrics.record_tokens(response)
+        return response
+
+    def send(self, request, *args, **kwargs):
+        if not _in_create.get():
+            return original_send(self, request, *args, **kwargs)
+        try:
+            response = original_send(self, request, *args, **kwargs)
+        except Exception as exc:
+            metrics.record_request(exc=exc)
+            raise
+        metrics.record_status(response.status_code)
+        return response
+
+    Harness.run = run
+    Completions.create = create
+    httpx.Client.send = send
+
+    def undo():
+        httpx.Client.send = original_send
+        Completions.create = original_create
+        Harness.run = original_run
+
+    return undo
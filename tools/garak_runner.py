@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Run garak in-process with the judge and translation caches installed.
+
+``run_garak.py`` calls :func:`run` directly for a single-process run, and
+sharded runs start one ``python -m tools.garak_runner`` per shard in place
+of ``python -m garak``. Which caches are installed, and how they batch, is
+read from the environment so the shard processes inherit the settings:
+
+``GARAK_JUDGE_CACHE``
+    ``0`` disables the judge cache (on by default).
+``GARAK_TRANSLATION_CACHE``
+    ``1`` enables the translation cache (off by default, as it patches
+    ``LocalHFTranslator`` internals).
+``JUDGE_CACHE_BATCH`` / ``TRANSLATION_CACHE_BATCH``
+    Batch sizes; ``0`` or unset means no batching.
+``JUDGE_CACHE_DIR`` / ``TRANSLATION_CACHE_DIR``
+    Store locations.
+
+Per-probe wall time, requests and tokens (``tools/garak_metrics.py``) are
+always recorded and written to ``metrics_path`` when one is given.
+
+Usage:
+  python -m tools.garak_runner --config data/garak.yaml --stats stats.json --metrics metrics.json
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+import yaml
+
+from pipelines.instrumentation import StageMetrics
+from tools import garak_metrics, judge_cache, translation_cache
+
+
+def _enabled(name, default="1"):
+    return os.environ.get(name, default) not in ("", "0", "false")
+
+
+def _batch(name):
+    return int(os.environ.get(name, "0")) or None
+
+
+def run(config_path, stats_path=None, metrics_path=None):
+    """Run ``garak --config config_path`` with the caches the environment enables.
+
+    Per-probe counters (see ``tools/garak_metrics.py``) are written to
+    ``metrics_path`` as JSON.
+
+    Returns
+    -------
+    dict
+        ``{"judge_cache": ..., "translation_cache": ...}`` stats for the
+        enabled caches, also written to ``stats_path`` as JSON.
+    """
+    import garak.cli
+
+    config = yaml.safe_load(Path(config_path).read_text())
+    caches = {}
+    probe_metrics = StageMetrics()
+    # Installed first, so judge cache hits never reach its request counter
+    undos = [garak_metrics.install(probe_metrics)]
+    if _enabled("GARAK_JUDGE_CACHE"):
+        caches["judge_cache"] = judge_cache.JudgeCache.from_config(
+            config, batch_size=_batch("JUDGE_CACHE_BATCH")
+        )
+        undos.append(judge_cache.install(caches["judge_cache"]))
+    if _enabled("GARAK_TRANSLATION_CACHE", default="0") and config.get("run", {}).get("langproviders"):
+        caches["translation_cache"] = translation_cache.TranslationMemo.from_env(
+            batch_size=_batch("TRANSLATION_CACHE_BATCH")
+        )
+        undos.append(translation_cache.install(caches["translation_cache"]))
+
+    try:
+        garak.cli.main(["--config", str(config_path)])
+    finally:
+        for undo in reversed(undos):
+            undo()
+        stats = {name: cache.stats() for name, cache in caches.items()}
+        for cache in caches.values():
+            cache.store.close()
+        if stats_path:
+            Path(stats_path).write_text(json.dumps(stats))
+        if metrics_path:
+            probe_metrics.write_json(metrics_path)
+    return stats
+
+
+def merge_stats(stats_list):
+    """Sum per-shard :func:`run` stats into one run summary."""
+    merged = {}
+    for stats in stats_list:
+        for name, counters in stats.items():
+            total = merged.setdefault(name, {})
+            for field, value in counters.items():
+                if field == "entries":
+                    # Shards share one store, so its size is not additive
+                    total[field] = max(total.get(field, 0), value)
+                elif field != "hit_rate":
+                    total[field] = total.get(field, 0) + value
+    for total in merged.values():
+        lookups = total.get("hits", 0) + total.get("misses", 0)
+        total["hit_rate"] = total.get("hits", 0) / lookups if lookups else 0.0
+    return merged
+
+
+def format_stats(stats):
+    """One summary line per cache."""
+    return [
+        f"{name.replace('_', ' ').capitalize()}: {c['hits']} hits, {c['misses']} misses "
+        f"({c['hit_rate']:.1%} hit rate)"
+        + "".join(f", {c[k]} {k.replace('_', ' ')}" for k in ("batched", "batches", "model_loads") if k in c)
+        for name, c in stats.items()
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run garak with the judge and translation caches.")
+    parser.add_argument("--config", required=True, help="garak config (e.g. data/garak.yaml)")
+    parser.add_argument("--stats", help="Write cache hit/miss counters to this JSON file")
+    parser.add_argument("--metrics", help="Write per-probe timing, request and token counters to this JSON file")
+    args = parser.parse_args()
+
+    for line in format_stats(run(args.config, args.stats, args.metrics)):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
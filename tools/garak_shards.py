@@ -0,0 +1,233 @@
+"""Sharded garak runs: per-shard configs, a process pool and a report merge.
+
+One garak process walks every intent x probe cell sequentially, which leaves
+the target and judge endpoints mostly idle. ``plan_shards`` splits the run
+by probe and/or intent; every shard gets its own copy of ``data/garak.yaml``
+with a narrowed ``plugins.probe_spec`` / ``cas.intent_spec`` and its own
+report prefix. ``run_shards`` runs them as separate garak processes, since
+garak keeps its configuration in module globals. ``merge_reports`` then
+stitches the shard reports into a single ``garak.<uuid>.report.jsonl``.
+
+The merged report keeps the setup and init entries of the first shard, with
+the spec fields restored to the full run, then every attempt and eval entry
+of every shard, then the last completion entry. Shard digests only summarise
+their own shard and are dropped.
+"""
+
+import copy
+import json
+import os
+import subprocess
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import yaml
+
+SHARD_BY = ("none", "probe", "intent", "both")
+# Entry types copied once, from the first shard, ahead of everything else
+_HEADER_TYPES = ("start_run setup", "init")
+_DROPPED_TYPES = ("completion", "digest")
+_REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def plan_shards(config, intents, shard_by="probe"):
+    """Split a garak config into ``{"probe_spec", "intent_spec"}`` shards.
+
+    Parameters
+    ----------
+    config : dict
+        Parsed ``data/garak.yaml``.
+    intents : list[str]
+        Intent ids from ``trait_typology.json``.
+    shard_by : str
+        One of ``SHARD_BY``; ``both`` gives one shard per intent x probe cell.
+
+    Returns
+    -------
+    list[dict]
+    """
+    if shard_by not in SHARD_BY:
+        raise ValueError(f"shard_by must be one of {SHARD_BY}, got {shard_by!r}")
+    probe_spec = config["plugins"]["probe_spec"]
+    intent_spec = config.get("cas", {}).get("intent_spec", "*")
+    probes = [p.strip() for p in probe_spec.split(",") if p.strip()]
+    probe_specs = probes if shard_by in ("probe", "both") else [probe_spec]
+    intent_specs = list(intents) if shard_by in ("intent", "both") else [intent_spec]
+    return [{"probe_spec": p, "intent_spec": i} for i in intent_specs for p in probe_specs]
+
+
+def restrict_intents(config, intents):
+    """Copy of ``config`` that only serves ``intents`` (a list of intent ids)."""
+    config = copy.deepcopy(config)
+    config.setdefault("cas", {})["intent_spec"] = ",".join(intents)
+    return config
+
+
+def report_config(config, report_dir, report_prefix):
+    """Copy of ``config`` writing ``<report_dir>/<report_prefix>.report.jsonl``."""
+    config = copy.deepcopy(config)
+    reporting = config.setdefault("reporting", {})
+    reporting["report_dir"] = str(report_dir)
+    reporting["report_prefix"] = report_prefix
+    return config
+
+
+def shard_config(config, shard, report_dir, report_prefix):
+    """Copy of ``config`` restricted to ``shard`` and reporting to ``report_dir``.
+
+    A ``generations`` key in ``shard`` overrides ``run.generations``.
+    """
+    config = report_config(config, report_dir, report_prefix)
+    config["plugins"]["probe_spec"] = shard["probe_spec"]
+    config.setdefault("cas", {})["intent_spec"] = shard["intent_spec"]
+    if "generations" in shard:
+        config.setdefault("run", {})["generations"] = shard["generations"]
+    return config
+
+
+def run_shards(config, shards, work_dir, workers=4):
+    """Run every shard as its own garak process, at most ``workers`` at a time.
+
+    Shards run through ``tools.garak_runner``, so they share the judge and
+    translation caches configured in the environment. Shard configs, logs,
+    reports, cache stats and probe metrics are written to ``work_dir``.
+
+    Returns
+    -------
+    list[dict]
+        Per shard: ``shard``, ``report`` (Path), ``log`` (Path),
+        ``returncode``, the shard's cache ``stats`` and per-probe
+        ``metrics`` (``StageMetrics.to_dict()``), in ``shards`` order.
+    """
+    work_dir = Path(work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(_REPO_ROOT), env.get("PYTHONPATH")]))
+
+    def run(item):
+        n, shard = item
+        prefix = f"shard{n:03d}"
+        config_path = work_dir / f"{prefix}.yaml"
+        config_path.write_text(yaml.safe_dump(shard_config(config, shard, work_dir, prefix), sort_keys=False))
+        log_path = work_dir / f"{prefix}.log"
+        stats_path = work_dir / f"{prefix}.cache_stats.json"
+        metrics_path = work_dir / f"{prefix}.metrics.json"
+        command = [sys.executable, "-m", "tools.garak_runner", "--config", str(config_path),
+                   "--stats", str(stats_path), "--metrics", str(metrics_path)]
+        with open(log_path, "w") as log:
+            proc = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT, env=env)
+        print(f"  {prefix} [{shard['probe_spec']} / {shard['intent_spec']}] exit {proc.returncode}")
+        return {
+            "shard": shard,
+            "report": work_dir / f"{prefix}.report.jsonl",
+            "log": log_path,
+            "returncode": proc.returncode,
+            "stats": json.loads(stats_path.read_text()) if stats_path.exists() else {},
+            "metrics": json.loads(metrics_path.read_text()) if metrics_path.exists() else {},
+        }
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run, enumerate(shards)))
+
+
+def merge_reports(report_paths, output_path, setup_overrides=None, extra_entries=()):
+    """Stream shard reports into one report ``generate_report.py`` accepts.
+
+    Parameters
+    ----------
+    report_paths : list[Path]
+        Shard ``*.report.jsonl`` files; missing ones are skipped.
+    output_path : Path
+        Merged report to write.
+    setup_overrides : dict, optional
+        Keys to overwrite in the setup entry, e.g. the full ``plugins.probe_spec``.
+    extra_entries : Iterable[dict]
+        Entries written after the shard entries, ahead of the completion entry.
+
+    Returns
+    -------
+    int
+        Number of attempt entries written.
+    """
+    report_paths = [Path(p) for p in report_paths if Path(p).exists()]
+    if not report_paths:
+        raise FileNotFoundError("No shard reports to merge")
+    output_path = Path(output_path)
+    tmp = output_path.with_name(output_path.name + ".tmp")
+    attempts = 0
+    completion = None
+    with open(tmp, "w") as out:
+        for n, path in enumerate(report_paths):
+            with open(path) as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    entry_type = entry.get("entry_type")
+                    if entry_type in _HEADER_TYPES:
+                        if n == 0:
+                            if entry_type == "start_run setup":
+                                entry.update(setup_overrides or {})
+                            out.write(json.dumps(entry) + "\n")
+                        continue
+                    if entry_type == "completion":
+                        completion = entry
+                    if entry_type in _DROPPED_TYPES:
+                        continue
+                    attempts += entry_type == "attempt"
+                    out.write(line if line.endswith("\n") else line + "\n")
+        for entry in extra_entries:
+            out.write(json.dumps(entry) + "\n")
+        if completion:
+            out.write(json.dumps(completion) + "\n")
+    tmp.replace(output_path)
+    return attempts
+
+
+def merge_hitlogs(hitlog_paths, output_path):
+    """Concatenate shard ``*.hitlog.jsonl`` files; returns the number of hits."""
+    hits = 0
+    with open(output_path, "w") as out:
+        for path in hitlog_paths:
+            if Path(path).exists():
+                with open(path) as f:
+                    for line in f:
+                        if line.strip():
+                            out.write(line if line.endswith("\n") else line + "\n")
+                            hits += 1
+    return hits
+
+
+def run_sharded(config_path, intents, garak_runs, shard_by="probe", workers=4):
+    """Plan, run and merge a sharded garak run.
+
+    Returns
+    -------
+    tuple[Path, list[dict]]
+        The merged report and the per-shard results of :func:`run_shards`.
+    """
+    config = yaml.safe_load(Path(config_path).read_text())
+    shards = plan_shards(config, intents, shard_by)
+    run_id = str(uuid.uuid4())
+    work_dir = Path(garak_runs) / "shards" / run_id
+    print(f"Shards:   {len(shards)} by {shard_by}, {workers} workers -> {work_dir}")
+
+    results = run_shards(config, shards, work_dir, workers)
+
+    merged = Path(garak_runs) / f"garak.{run_id}.report.jsonl"
+    attempts = merge_reports(
+        [r["report"] for r in results],
+        merged,
+        setup_overrides={
+            "plugins.probe_spec": config["plugins"]["probe_spec"],
+            "cas.intent_spec": config.get("cas", {}).get("intent_spec", "*"),
+        },
+    )
+    merge_hitlogs(
+        [r["report"].with_name(r["report"].name.replace(".report.", ".hitlog.")) for r in results],
+        merged.with_name(merged.name.replace(".report.", ".hitlog.")),
+    )
+    print(f"Merged {attempts} attempt entries from {len(results)} shards")
+    return merged, results
@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""Long-lived garak worker that keeps imports, models and connections warm.
+
+Each ``run_garak.py`` / ``generate_report.py`` invocation pays for importing
+garak and ``llama_stack_provider_trustyai_garak``, loading the MarianMT
+translators and opening new HTTPS connections to the target and judge. In
+a campaign of many small, targeted runs, that startup costs more than the
+probing itself. ``serve`` pays it once. It then takes requests over a Unix
+socket, one at a time, and runs them in-process:
+
+- garak, the probe/detector/generator modules named in the config, and the
+  report renderer are imported at startup;
+- translator models stay loaded after their first use, with or without the
+  translation memo (``tools/translation_cache.keep_models_loaded``);
+- every ``openai.OpenAI`` client garak creates (target, judge, TAP attacker)
+  shares one keep-alive ``httpx`` pool, so connections survive across runs;
+- ``trait_typology.json`` is re-read only when it changes.
+
+``garak._config`` is reloaded before each run, as ``notebooks/03-run-garak.ipynb``
+does, so no settings carry over from the previous request.
+
+Requests and responses are JSON lines. The worker streams
+``{"event": "output", "text": ...}`` for everything the run prints, then
+ends with one ``{"event": "result", ...}`` or ``{"event": "error", ...}``.
+``call`` is the client side; ``run_garak.py --worker`` and
+``generate_report.py --worker`` use it.
+
+Usage:
+  python -m tools.garak_worker                          # serve on the default socket
+  python -m tools.garak_worker --socket /tmp/garak.sock --config data/garak.yaml
+  python -m tools.garak_worker --ping
+  python -m tools.garak_worker --shutdown
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+import uuid
+from pathlib import Path
+
+import yaml
+
+from tools import translation_cache
+
+# Environment read by tools.garak_runner; forwarded from the client with every run
+FORWARDED_ENV = (
+    "GARAK_JUDGE_CACHE",
+    "JUDGE_CACHE_BATCH",
+    "GARAK_TRANSLATION_CACHE",
+    "TRANSLATION_CACHE_BATCH",
+)
+COMMANDS = ("ping", "run", "report", "shutdown")
+
+
+class WorkerError(RuntimeError):
+    """The worker could not be reached or the request failed."""
+
+
+def default_socket():
+    """``GARAK_WORKER_SOCKET``, else ``garak-worker.sock`` in ``XDG_RUNTIME_DIR`` or the temp dir."""
+    if os.environ.get("GARAK_WORKER_SOCKET"):
+        return Path(os.environ["GARAK_WORKER_SOCKET"])
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or "/tmp"
+    return Path(runtime_dir) / f"garak-worker-{os.getuid()}.sock"
+
+
+# ── Warm state ─────────────────────────────────────────────────────────────────
+
+def install_http_pool(max_connections=64, keepalive_expiry=120.0):
+    """Give every ``openai.OpenAI`` client created from now on one shared ``httpx`` pool.
+
+    Clients that pass their own ``http_client`` keep it. Returns an undo
+    function, which also closes the pool.
+    """
+    import httpx
+    import openai
+
+    class SharedClient(openai.DefaultHttpxClient):
+        def close(self):
+            # Called by each OpenAI client's close(); the pool outlives them
+            pass
+
+    pool = SharedClient(limits=httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=keepalive_expiry,
+    ))
+    original_init = openai.OpenAI.__init__
+
+    def __init__(self, *args, **kwargs):
+        if kwargs.get("http_client") is None:
+            kwargs["http_client"] = pool
+        original_init(self, *args, **kwargs)
+
+    openai.OpenAI.__init__ = __init__
+
+    def undo():
+        openai.OpenAI.__init__ = original_init
+        httpx.Client.close(pool)
+
+    return undo
+
+
+def _plugin_modules(config):
+    """garak modules behind the probes, detectors, generators and langproviders of ``config``."""
+    plugins = config.get("plugins", {})
+    names = [f"garak.probes.{p.strip().split('.')[0]}" for p in plugins.get("probe_spec", "").split(",") if p.strip()]
+    names += [f"garak.detectors.{d.strip().split('.')[0]}"
+              for d in plugins.get("detector_spec", "").split(",") if d.strip()]
+    for spec in (plugins.get("target_type"),
+                 plugins.get("detectors", {}).get("judge", {}).get("detector_model_type")):
+        if spec:
+            names.append(f"garak.generators.{spec.split('.')[0]}")
+    for provider in config.get("run", {}).get("langproviders") or []:
+        names.append(f"garak.langproviders.{provider['model_type'].split('.')[0]}")
+    return list(dict.fromkeys(names))
+
+
+def preload(config_path=None):
+    """Import garak, the report renderer and the plugins ``config_path`` uses."""
+    modules = ["garak.cli", "garak._config", "garak.harnesses.base",
+               "llama_stack_provider_trustyai_garak.result_utils"]
+    if config_path:
+        modules += _plugin_modules(yaml.safe_load(Path(config_path).read_text()))
+    loaded = []
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"Preload: skipped {name} ({e})")
+        else:
+            loaded.append(name)
+    return loaded
+
+
+class _EventStream(io.TextIOBase):
+    """Text stream that sends each complete line to the client as an output event."""
+
+    def __init__(self, send):
+        self._send = send
+        self._buffer = ""
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split("\n")
+        for line in lines:
+            self._send({"event": "output", "text": line})
+        return len(text)
+
+    def flush(self):
+        if self._buffer:
+            self._send({"event": "output", "text": self._buffer})
+            self._buffer = ""
+
+
+@contextlib.contextmanager
+def _environ(overrides):
+    saved = {k: os.environ.get(k) for k in overrides}
+    os.environ.update({k: str(v) for k, v in overrides.items()})
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+class Worker:
+    """Executes requests against the warm process state.
+
+    Parameters
+    ----------
+    garak_runs : Path
+        Report directory; run configs and metrics go to ``<garak_runs>/worker``.
+    typology_path : Path
+        ``trait_typology.json``; intent subsets are checked against it.
+    """
+
+    def __init__(self, garak_runs, typology_path):
+        self.garak_runs = Path(garak_runs)
+        self.typology_path = Path(typology_path)
+        self.started = time.time()
+        self.runs = 0
+        self.preloaded = []
+        self._typology = (None, None)
+
+    def typology(self):
+        mtime = self.typology_path.stat().st_mtime
+        if self._typology[0] != mtime:
+            self._typology = (mtime, json.loads(self.typology_path.read_text()))
+        return self._typology[1]
+
+    def ping(self):
+        return {
+            "pid": os.getpid(),
+            "uptime": time.time() - self.started,
+            "runs": self.runs,
+            "preloaded": self.preloaded,
+        }
+
+    def run(self, config, intents=None, env=None):
+        """One garak run through ``tools.garak_runner``; returns its report, cache stats and metrics."""
+        import garak._config
+
+        from tools import garak_runner
+        from tools.garak_shards import report_config, restrict_intents
+
+        config_data = yaml.safe_load(Path(config).read_text())
+        if intents:
+            unknown = sorted(set(intents) - set(self.typology()))
+            if unknown:
+                raise ValueError(f"Unknown intents: {unknown}")
+            config_data = restrict_intents(config_data, intents)
+        prefix = f"garak.{uuid.uuid4()}"
+        config_data = report_config(config_data, self.garak_runs, prefix)
+
+        run_dir = self.garak_runs / "worker"
+        run_dir.mkdir(parents=True, exist_ok=True)
+        config_path = run_dir / f"{prefix}.yaml"
+        config_path.write_text(yaml.safe_dump(config_data, sort_keys=False))
+        metrics_path = run_dir / f"{prefix}.metrics.json"
+
+        importlib.reload(garak._config)
+        start = time.monotonic()
+        with _environ(env or {}):
+            try:
+                stats = garak_runner.run(config_path, metrics_path=metrics_path)
+            except SystemExit as e:
+                # garak.cli exits through argparse on a bad config; that must not stop the worker
+                raise RuntimeError(f"garak exited with status {e.code}") from e
+        self.runs += 1
+        report = self.garak_runs / f"{prefix}.report.jsonl"
+        html = report.with_name(report.name.replace(".jsonl", ".html"))
+        return {
+            "report": str(report),
+            "html": str(html) if html.exists() else None,
+            "stats": stats,
+            "metrics": json.loads(metrics_path.read_text()) if metrics_path.exists() else {},
+            "seconds": time.monotonic() - start,
+        }
+
+    def report(self, report, eval_threshold=0.5, summary_only=False, html_max_mb=None):
+        """``generate_report.py`` in-process: streamed per-probe summary and, unless
+        ``summary_only`` or the report is over ``html_max_mb``, the HTML."""
+        from tools.report_stream import HTML_MAX_MB, aggregate_report, print_summary, write_html_report
+
+        report_path = Path(report)
+        print_summary(aggregate_report(report_path, eval_threshold))
+        html_path = None
+        if not summary_only:
+            html_path = write_html_report(report_path, HTML_MAX_MB if html_max_mb is None else html_max_mb)
+        return {"report": str(report_path), "html": str(html_path) if html_path else None}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        connected = True
+
+        def send(event):
+            nonlocal connected
+            if not connected:
+                return
+            try:
+                self.wfile.write((json.dumps(event) + "\n").encode())
+                self.wfile.flush()
+            except OSError:
+                # Client went away; finish the run anyway so its report is complete
+                connected = False
+
+        try:
+            request = json.loads(self.rfile.readline())
+            command = request.pop("command", None)
+            if command not in COMMANDS:
+                raise ValueError(f"command must be one of {COMMANDS}, got {command!r}")
+            if command == "shutdown":
+                send({"event": "result"})
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+            stream = _EventStream(send)
+            with contextlib.redirect_stdout(stream), contextlib.redirect_stderr(stream):
+                try:
+                    result = getattr(self.server.worker, command)(**request)
+                finally:
+                    stream.flush()
+            send({"event": "result", **result})
+        except (Exception, SystemExit) as e:
+            traceback.print_exc()
+            send({"event": "error", "error": f"{type(e).__name__}: {e}"})
+
+
+class _Server(socketserver.UnixStreamServer):
+    def __init__(self, socket_path, worker):
+        self.worker = worker
+        super().__init__(str(socket_path), _Handler)
+
+
+def serve(socket_path=None, config_path=None, http_connections=64):
+    """Warm up and serve requests on ``socket_path`` until a ``shutdown`` request."""
+    from llama_stack_provider_trustyai_garak.utils import _ensure_xdg_vars
+
+    _ensure_xdg_vars()
+    xdg_data = Path(os.environ["XDG_DATA_HOME"])
+    worker = Worker(
+        garak_runs=xdg_data / "garak" / "garak_runs",
+        typology_path=xdg_data / "garak" / "data" / "cas" / "trait_typology.json",
+    )
+    worker.preloaded = preload(config_path)
+    undo_pool = install_http_pool(http_connections)
+    try:
+        undo_models = translation_cache.keep_models_loaded()
+    except ImportError as e:
+        print(f"Translator models are not kept loaded ({e})")
+        undo_models = None
+
+    socket_path = Path(socket_path or default_socket())
+    if socket_path.exists():
+        if available(socket_path):
+            raise WorkerError(f"A worker is already listening on {socket_path}")
+        socket_path.unlink()
+    # The socket accepts run requests, so only its owner may connect
+    umask = os.umask(0o177)
+    try:
+        server = _Server(socket_path, worker)
+    finally:
+        os.umask(umask)
+
+    print(f"garak worker {os.getpid()} listening on {socket_path} ({len(worker.preloaded)} modules preloaded)")
+    try:
+        with server:
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if undo_models:
+            undo_models()
+        undo_pool()
+        socket_path.unlink(missing_ok=True)
+    print("garak worker stopped")
+
+
+# ── Client ─────────────────────────────────────────────────────────────────────
+
+def call(command, socket_path=None, out=None, timeout=None, **params):
+    """Send one request to the worker, echo its output to ``out`` and return the result.
+
+    Raises
+    ------
+    WorkerError
+        When no worker listens on ``socket_path`` or the request failed.
+    """
+    out = out or sys.stdout
+    socket_path = Path(socket_path or default_socket())
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(str(socket_path))
+    except OSError as e:
+        client.close()
+        raise WorkerError(f"No garak worker on {socket_path} ({e}); start one with python -m tools.garak_worker")
+
+    with client, client.makefile("rb") as responses:
+        client.sendall((json.dumps({"command": command, **params}) + "\n").encode())
+        for line in responses:
+            event = json.loads(line)
+            kind = event.pop("event")
+            if kind == "output":
+                print(event["text"], file=out)
+            elif kind == "error":
+                raise WorkerError(event["error"])
+            else:
+                return event
+    raise WorkerError("The worker closed the connection without a result")
+
+
+def available(socket_path=None):
+    """True when a worker answers a ping on ``socket_path``."""
+    try:
+        call("ping", socket_path, timeout=5)
+    except (WorkerError, OSError):
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve garak runs and reports from a warm process.")
+    parser.add_argument("--socket", type=Path, help=f"Unix socket (default: {default_socket()})")
+    parser.add_argument("--config", type=Path, help="garak config whose plugins to preload (e.g. data/garak.yaml)")
+    parser.add_argument("--http-connections", type=int, default=64,
+                        help="Keep-alive connections shared by the target, judge and attacker clients")
+    parser.add_argument("--ping", action="store_true", help="Print the status of a running worker and exit")
+    parser.add_argument("--shutdown", action="store_true", help="Stop a running worker and exit")
+    args = parser.parse_args()
+
+    try:
+        if args.ping:
+            print(json.dumps(call("ping", args.socket, timeout=5), indent=2))
+        elif args.shutdown:
+            call("shutdown", args.socket, timeout=5)
+            print("Shutdown requested")
+        else:
+            serve(args.socket, args.config, args.http_connections)
+    except WorkerError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
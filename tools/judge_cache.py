@@ -0,0 +1,201 @@
+"""Persistent verdict cache for garak's ``judge.MulticlassJudge`` detector.
+
+The judge makes one chat completion per (question, response) pair. The same
+pairs come back across the SPOIntent variants, across generations that
+produce the same refusal, and across re-runs. ``install`` wraps the OpenAI
+SDK's ``chat.completions.create`` (which garak's ``OpenAICompatible``
+generator calls), and serves judge requests from a ``LLMResponseCache``
+store. A request counts as a judge request when it targets the configured
+judge model and its system message carries the judge system prompt, so
+target, TAP attacker and TAP evaluator calls pass through untouched.
+
+The key is the judge model, system prompt and ``user_prompt_template``, plus
+the rendered user message that holds the question and response, plus the
+sampling parameters. Changing any of them invalidates the affected entries.
+
+With ``batch_size`` set, ``MulticlassJudge.detect`` first runs in a dry pass
+that only records the uncached judge requests of the attempt (one per
+generation). It sends them concurrently, then runs for real against the
+warmed cache.
+
+``tools/garak_runner.py`` installs it around a garak run; ``JUDGE_CACHE_DIR``
+overrides the store location.
+"""
+
+import contextvars
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pipelines.llm_cache import DEFAULT_CACHE_DIR as _LLM_CACHE_DIR
+from pipelines.llm_cache import LLMResponseCache
+
+DEFAULT_CACHE_DIR = _LLM_CACHE_DIR.parent / "judge"
+DETECTOR = "MulticlassJudge"
+
+# Returned to the detector during the dry pass; its score is discarded
+_PLACEHOLDER_VERDICT = json.dumps(
+    {c: {"percentage": 100 if c == "other" else 0, "explanation": ""}
+     for c in ("complied", "rejected", "alternative", "other")}
+)
+
+
+def judge_settings(config):
+    """``(model, system_prompt, user_prompt_template)`` of the judge in a garak config."""
+    judge = config["plugins"]["detectors"]["judge"]
+    options = judge.get(DETECTOR, {})
+    return (
+        judge["detector_model_name"],
+        (options.get("system_prompt") or "").strip(),
+        options.get("user_prompt_template") or "",
+    )
+
+
+class JudgeCache:
+    """Judge verdict lookups on top of an ``LLMResponseCache`` store.
+
+    Parameters
+    ----------
+    model, system_prompt, user_prompt_template : str
+        Judge settings, see :func:`judge_settings`.
+    store : LLMResponseCache
+        Where verdicts are persisted.
+    batch_size : int, optional
+        Concurrent judge requests per attempt; None disables the dry pass.
+    """
+
+    def __init__(self, model, system_prompt, user_prompt_template, store, batch_size=None):
+        self.model = model
+        self.system_prompt = system_prompt
+        self.user_prompt_template = user_prompt_template
+        self.store = store
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self.batched = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, cache_dir=None, batch_size=None):
+        """Build a cache for the judge configured in a parsed ``garak.yaml``."""
+        store = LLMResponseCache(cache_dir or os.environ.get("JUDGE_CACHE_DIR", DEFAULT_CACHE_DIR))
+        return cls(*judge_settings(config), store, batch_size)
+
+    def matches(self, request):
+        if request.get("model") != self.model or request.get("stream"):
+            return False
+        messages = request.get("messages") or []
+        return bool(
+            messages
+            and messages[0].get("role") == "system"
+            and self.system_prompt in str(messages[0].get("content", ""))
+        )
+
+    def key(self, request):
+        judged = hashlib.sha256()
+        for part in (self.system_prompt, self.user_prompt_template, self.store.key(request)):
+            judged.update(part.encode() + b"\x00")
+        return judged.hexdigest()
+
+    def count(self, hits=0, misses=0, batched=0):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self.batched += batched
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "batched": self.batched,
+            "entries": self.store.stats()["entries"],
+        }
+
+
+def _placeholder(request):
+    from openai.types.chat import ChatCompletion
+
+    return ChatCompletion.model_validate({
+        "id": "judge-cache-dry-run",
+        "object": "chat.completion",
+        "created": 0,
+        "model": request.get("model", ""),
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": _PLACEHOLDER_VERDICT},
+        }],
+    })
+
+
+def install(cache):
+    """Serve judge requests from ``cache``; returns an undo function."""
+    from openai.resources.chat.completions import Completions
+    from openai.types.chat import ChatCompletion
+
+    original_create = Completions.create
+    local = threading.local()
+
+    def create(self, *args, **kwargs):
+        if args or not cache.matches(kwargs):
+            return original_create(self, *args, **kwargs)
+        key = cache.key(kwargs)
+        hit = cache.store.get(key)
+        recording = getattr(local, "recording", None)
+        if hit is not None:
+            if recording is None and key not in getattr(local, "prefetched", ()):
+                cache.count(hits=1)
+            return ChatCompletion.model_validate(hit)
+        if recording is not None:
+            recording[key] = (self, kwargs)
+            return _placeholder(kwargs)
+        cache.count(misses=1)
+        response = original_create(self, *args, **kwargs)
+        cache.store.put(key, response.model_dump())
+        return response
+
+    Completions.create = create
+    undos = [lambda: setattr(Completions, "create", original_create)]
+
+    if cache.batch_size:
+        from garak.detectors import judge
+
+        detector_cls = getattr(judge, DETECTOR)
+        original_detect = detector_cls.detect
+
+        def detect(self, attempt, *args, **kwargs):
+            local.recording = {}
+            try:
+                original_detect(self, attempt, *args, **kwargs)
+            finally:
+                pending, local.recording = local.recording, None
+
+            def send(item):
+                context, (key, (completions, request)) = item
+                response = context.run(original_create, completions, **request)
+                cache.store.put(key, response.model_dump())
+
+            if pending:
+                # Each request runs in a copy of this thread's context (e.g. the probe being scored)
+                items = [(contextvars.copy_context(), item) for item in pending.items()]
+                with ThreadPoolExecutor(max_workers=cache.batch_size) as pool:
+                    list(pool.map(send, items))
+                cache.count(misses=len(pending), batched=len(pending))
+            local.prefetched = set(pending)
+            try:
+                return original_detect(self, attempt, *args, **kwargs)
+            finally:
+                local.prefetched = set()
+
+        detector_cls.detect = detect
+        undos.append(lambda: setattr(detector_cls, "detect", original_detect))
+
+    def undo():
+        for restore in reversed(undos):
+            restore()
+
+    return undo
@@ -0,0 +1,208 @@
+"""Persistent translation memo and batched MarianMT translation for garak.
+
+``multilingual.TranslationIntent`` translates every stub into the target
+language and every response back through ``local.LocalHFTranslator``
+(Helsinki-NLP opus-mt models on CPU in ``data/garak.yaml``). Those texts
+repeat across runs. ``install`` patches the translator so that:
+
+- every ``_translate`` call is looked up by ``(model, direction, text)`` in a
+  persistent ``LLMResponseCache`` store before running the model;
+- the model is only loaded on the first cache miss, so a warm run neither
+  loads MarianMT nor runs a single forward pass. Once loaded, it stays in
+  memory for the life of the process, so later runs in the same process
+  reuse it;
+- with ``batch_size`` set, ``get_text`` first runs a dry pass that only
+  records the uncached chunks, translates them in padded, length-sorted
+  batches, and then runs for real against the warm memo.
+
+m2m100 models need language tokens forced at generation time and are only
+memoized, not batched.
+
+``keep_models_loaded`` keeps loaded models for the life of the process
+without the memo; ``tools/garak_worker.py`` installs it at startup so runs
+reuse the models whether or not the memo is enabled.
+"""
+
+import hashlib
+import os
+import threading
+
+from pipelines.llm_cache import DEFAULT_CACHE_DIR as _LLM_CACHE_DIR
+from pipelines.llm_cache import LLMResponseCache
+
+DEFAULT_CACHE_DIR = _LLM_CACHE_DIR.parent / "translation"
+
+# (model, source, target) -> the attributes _load_langprovider set, kept across runs
+_loaded_models = {}
+_MISSING = object()
+
+
+class TranslationMemo:
+    """``(model, direction, text) -> translation`` store with hit/miss counters.
+
+    Parameters
+    ----------
+    store : LLMResponseCache
+        Where translations are persisted.
+    batch_size : int, optional
+        Chunks per MarianMT forward pass; None translates one chunk at a time.
+    """
+
+    def __init__(self, store, batch_size=None):
+        self.store = store
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.model_loads = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, cache_dir=None, batch_size=None):
+        """Build a memo in ``cache_dir``, falling back to ``TRANSLATION_CACHE_DIR``."""
+        store = LLMResponseCache(cache_dir or os.environ.get("TRANSLATION_CACHE_DIR", DEFAULT_CACHE_DIR))
+        return cls(store, batch_size)
+
+    @staticmethod
+    def key(translator):
+        model = getattr(translator, "model_name", type(translator).__name__)
+        prefix = f"{model}\x00{translator.source_lang}\x00{translator.target_lang}\x00"
+        return lambda text: hashlib.sha256((prefix + text).encode()).hexdigest()
+
+    def get(self, key):
+        hit = self.store.get(key)
+        return None if hit is None else hit["text"]
+
+    def put(self, key, text):
+        self.store.put(key, {"text": text})
+
+    def count(self, hits=0, misses=0, batches=0, model_loads=0):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self.batches += batches
+            self.model_loads += model_loads
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "batches": self.batches,
+            "model_loads": self.model_loads,
+            "entries": self.store.stats()["entries"],
+        }
+
+
+def _load_shared(translator, load):
+    """Give ``translator`` the model of its ``(model, direction)``, running ``load`` only once per process.
+
+    Returns True when ``load`` ran.
+    """
+    model_key = (getattr(translator, "model_name", type(translator).__name__),
+                 translator.source_lang, translator.target_lang)
+    loaded = _loaded_models.get(model_key)
+    if loaded is not None:
+        vars(translator).update(loaded)
+        return False
+    before = dict(vars(translator))
+    load(translator)
+    _loaded_models[model_key] = {k: v for k, v in vars(translator).items() if before.get(k, _MISSING) is not v}
+    return True
+
+
+def keep_models_loaded():
+    """Load each ``LocalHFTranslator`` model once per process; returns an undo function."""
+    from garak.langproviders.local import LocalHFTranslator
+
+    original_load = LocalHFTranslator._load_langprovider
+
+    def load_langprovider(self):
+        _load_shared(self, original_load)
+
+    LocalHFTranslator._load_langprovider = load_langprovider
+
+    def undo():
+        LocalHFTranslator._load_langprovider = original_load
+
+    return undo
+
+
+def translate_batch(translator, texts):
+    """Translate ``texts`` with one padded MarianMT ``generate`` call."""
+    inputs = translator.tokenizer(texts, return_tensors="pt", padding=True, truncation=True)
+    outputs = translator.model.generate(**inputs.to(translator.device))
+    return translator.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+
+def install(memo):
+    """Route ``LocalHFTranslator`` through ``memo``; returns an undo function."""
+    from garak.langproviders.local import LocalHFTranslator
+
+    original_load = LocalHFTranslator._load_langprovider
+    original_translate = LocalHFTranslator._translate
+    original_get_text = LocalHFTranslator.get_text
+    local = threading.local()
+
+    def ensure_loaded(self):
+        if getattr(self, "_memo_loaded", False):
+            return
+        if _load_shared(self, original_load):
+            memo.count(model_loads=1)
+        self._memo_loaded = True
+
+    def load_langprovider(self):
+        # Deferred to the first cache miss
+        self._memo_loaded = False
+
+    def translate(self, text, *args, **kwargs):
+        key = TranslationMemo.key(self)(text)
+        hit = memo.get(key)
+        recording = getattr(local, "recording", None)
+        if hit is not None:
+            if recording is None and key not in getattr(local, "prefetched", ()):
+                memo.count(hits=1)
+            return hit
+        if recording is not None:
+            recording.setdefault(key, text)
+            return text
+        ensure_loaded(self)
+        translated = original_translate(self, text, *args, **kwargs)
+        memo.put(key, translated)
+        memo.count(misses=1)
+        return translated
+
+    def get_text(self, prompts, *args, **kwargs):
+        if not memo.batch_size or "m2m100" in getattr(self, "model_name", ""):
+            return original_get_text(self, prompts, *args, **kwargs)
+        local.recording = {}
+        try:
+            original_get_text(self, prompts, *args, **kwargs)
+        finally:
+            pending, local.recording = local.recording, None
+        if pending:
+            ensure_loaded(self)
+            # Similar lengths share a batch, so little compute goes to padding
+            items = sorted(pending.items(), key=lambda kv: len(kv[1]))
+            for start in range(0, len(items), memo.batch_size):
+                chunk = items[start:start + memo.batch_size]
+                for (key, _), translated in zip(chunk, translate_batch(self, [t for _, t in chunk])):
+                    memo.put(key, translated)
+                memo.count(misses=len(chunk), batches=1)
+        local.prefetched = set(pending)
+        try:
+            return original_get_text(self, prompts, *args, **kwargs)
+        finally:
+            local.prefetched = set()
+
+    LocalHFTranslator._load_langprovider = load_langprovider
+    LocalHFTranslator._translate = translate
+    LocalHFTranslator.get_text = get_text
+
+    def undo():
+        LocalHFTranslator._load_langprovider = original_load
+        LocalHFTranslator._translate = original_translate
+        LocalHFTranslator.get_text = original_get_text
+
+    return undo